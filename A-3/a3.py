@@ -1,3 +1,80 @@
+import heapq
+import math
+import mmap
+import multiprocessing
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+
+def _fill_levels(order,base,segments,levels,level,stop):
+    """Fill the rows level..stop-1 of the flat layout for the X-Tree nodes in segments"""
+    # order[i-base] is the point index at position i of the current level, i.e. the nodes
+    # in segments store their points sorted by y. Returns order and segments of level stop.
+    # TIME COMPLEXITY : O(n) per level
+
+    while segments and level < stop:
+        row = levels[level]
+        for lo,hi in segments:
+            row[lo:hi] = array('q',order[lo-base:hi-base])
+        next_order = [-1]*len(order)
+        next_segments = []
+        for lo,hi in segments:
+            mid = (lo+hi)//2
+            l = lo-base                                                 # next free slot of left child
+            r = mid+1-base                                              # next free slot of right child
+            for i in order[lo-base:hi-base]:
+                if i < mid:
+                    next_order[l] = i
+                    l += 1
+                elif i > mid:
+                    next_order[r] = i
+                    r += 1
+            if lo < mid:
+                next_segments.append((lo,mid))
+            if mid+1 < hi:
+                next_segments.append((mid+1,hi))
+        order = next_order
+        segments = next_segments
+        level += 1
+    return order, segments
+
+
+def _fill_levels_worker(task):
+    """Build the flat layout of the subtree covering [lo,hi) into the shared memory buffer"""
+    # the parent has written the points of the subtree sorted by y to levels[level][lo:hi]
+    levels_name, n, n_levels, level, lo, hi = task
+    levels_shm = shared_memory.SharedMemory(name=levels_name)
+    try:
+        rows = levels_shm.buf.cast('q')
+        levels = [rows[l*n:(l+1)*n] for l in range(n_levels)]
+        order = levels[level][lo:hi].tolist()
+        _fill_levels(order,lo,[(lo,hi)],levels,level,n_levels)
+    finally:
+        levels = rows = None
+        levels_shm.close()
+
+
+_shared_db = None                                                       # database of a worker of _query_many
+_shared_block = None                                                    # shared memory block it is a view of
+
+
+def _attach_database(name):
+    """Initializer of the workers of _query_many, opens the flat layout in shared memory"""
+    global _shared_db, _shared_block
+    _shared_block = shared_memory.SharedMemory(name=name)
+    _shared_db = PointDatabase._from_buffer(_shared_block.buf)
+
+
+def _query_many_worker(task):
+    """Answer one chunk of the (sorted) queries of _query_many on the shared database"""
+    method, arg, queries = task
+    return _shared_db._answer_sorted(queries,method,arg)
+
+
+
 class PointDatabase:
 
     class _XTreeNode:
@@ -12,14 +89,41 @@ class PointDatabase:
 
 
     class _YTreeNode:
-        __slots__ = "val",'left','right'
-        def __init__(self,val,left=None,right=None):
+        __slots__ = "val",'left','right','size'
+        def __init__(self,val,left=None,right=None,size=1):
             """Node for Y-Tree"""
             self.val = val
             self.left = left 
             self.right = right 
+            self.size = size                                    # number of nodes in the subtree rooted at this node
         
-    
+
+
+    class _FlatTree:
+        """2d Range Tree stored in flat arrays (see _build_flat), e.g. directly on a mmap"""
+        # xs, ys  : coordinates of the points sorted by (x,y)
+        # levels  : one array of n point indices per level of the X-Tree. The X-Tree node at
+        #           a level covering the points [lo,hi) stores its points sorted by y in
+        #           levels[level][lo:hi], which is exactly the inorder of its Y-Tree
+        # The flat tree is also a read only sequence of its (x-sorted) points, so it is both the
+        # points and the X-Tree of its bucket, [flat, flat]. It is queried by index (see
+        # _flat_canonical), the X-Tree functions hand it over to the _flat functions.
+        __slots__ = 'xs','ys','levels'
+        def __init__(self,xs,ys,levels):
+            self.xs = xs
+            self.ys = ys
+            self.levels = levels
+
+        def __len__(self):
+            return len(self.xs)
+
+        def __getitem__(self,i):
+            return (self.xs[i],self.ys[i])
+
+        def __iter__(self):
+            return zip(self.xs,self.ys)
+
+
 
     # -------------------- Utility functions ------------------------------------------
         
@@ -62,10 +166,23 @@ class PointDatabase:
         """Returns the inorder traversal of the given tree and stores it in arr."""
         # TIME COMPLEXITY : O(n)
 
-        if root:
-            self._inorder(root.left,arr)
-            arr.append(root.val)
-            self._inorder(root.right,arr)
+        arr.extend(self._iter_subtree(root))
+
+
+    def _iter_subtree(self,root):
+        """Yield the values of the given tree in inorder, using an explicit stack"""
+        # TIME COMPLEXITY : O(n)
+
+        stack = []
+        node = root
+        while stack or node != None:
+            if node != None:                                        # go down to the leftmost node
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node.val
+                node = node.right
 
     
     def _merge_sorted_arr(self, arr1, arr2):
@@ -97,9 +214,23 @@ class PointDatabase:
         if not arr:
             return None
         mid = len(arr) // 2
-        root = self._YTreeNode(arr[mid])                            # create a node at median
-        root.left = self._arr_to_bst(arr[:mid])                     # recursively call the function to create left subtree for points smaller than median
-        root.right = self._arr_to_bst(arr[mid + 1:])                # recursively call the function to create right subtree for points greater than median
+        root = self._YTreeNode(arr[mid],size=len(arr))              # create a node at median
+
+        # every entry (lo, hi, parent, is_left) is a subarray arr[lo:hi] still to be converted
+        # to a subtree and attached to parent, this avoids recursion and copying of subarrays
+        stack = [(0,mid,root,True),(mid+1,len(arr),root,False)]
+        while stack:
+            lo, hi, parent, is_left = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo+hi) // 2
+            node = self._YTreeNode(arr[mid],size=hi-lo)             # create a node at median of the subarray
+            if is_left:
+                parent.left = node
+            else:
+                parent.right = node
+            stack.append((lo,mid,node,True))                        # points smaller than median go to the left subtree
+            stack.append((mid+1,hi,node,False))                     # points greater than median go to the right subtree
         return root                                                 # return root
 
 
@@ -136,38 +267,47 @@ class PointDatabase:
         """Build the X-Tree (2d Range Tree) on given data"""
         # TIME COMPLEXITY : O(nlog(n))
 
-        if len(data)==0:                                            # Base Case
-            return None
+        # post order traversal of the subarrays data[lo:hi] with an explicit stack, the
+        # X-Trees of the left and right halves are pushed on built before their parent is built
+        stack = [(0,len(data),False)]
+        built = []
+        while stack:
+            lo, hi, halves_built = stack.pop()
 
-        if len(data)==1:                                            # Base Case
-            return self._XTreeNode(data[0],self._YTreeNode(data[0]))
+            if hi-lo==0:                                            # Base Case
+                built.append(None)
 
-        else:
-            # divide the data into two halves
-            mid = len(data)//2
-            x_median = data[mid]
-            ltreedata = data[:mid]
-            rtreedata = data[mid+1:]
+            elif hi-lo==1:                                          # Base Case
+                built.append(self._XTreeNode(data[lo],self._YTreeNode(data[lo])))
+
+            elif not halves_built:
+                # divide the data into two halves and create X-Tree on them first
+                mid = (lo+hi)//2
+                stack.append((lo,hi,True))
+                stack.append((mid+1,hi,False))
+                stack.append((lo,mid,False))
 
-            # recursively create X-Tree on left and right halves
-            ltree = self._build_x_tree(ltreedata)
-            rtree = self._build_x_tree(rtreedata)
+            else:
+                x_median = data[(lo+hi)//2]
+                rtree = built.pop()
+                ltree = built.pop()
+
+                # Merge the Y-Trees of left and right subtrees
+                merged_y_tree = None
 
-            # Merge the Y-Trees of left and right subtrees
-            merged_y_tree = None
+                if ltree != None and rtree != None:
+                    merged_y_tree = self._merge_tree(x_median,ltree.ytree,rtree.ytree)
 
-            if ltree != None and rtree != None:
-                merged_y_tree = self._merge_tree(x_median,ltree.ytree,rtree.ytree)
+                elif ltree == None and rtree != None:
+                    merged_y_tree = self._merge_tree(x_median, rtree.ytree)
 
-            elif ltree == None and rtree != None:
-                merged_y_tree = self._merge_tree(x_median, rtree.ytree)
+                elif ltree != None and rtree == None:
+                    merged_y_tree = self._merge_tree(x_median, ltree.ytree)
 
-            elif ltree != None and rtree == None:
-                merged_y_tree = self._merge_tree(x_median, ltree.ytree)
+                # create the node having x_median as val, and the the given Y-Tree, left and right subtrees
+                built.append(self._XTreeNode(x_median,merged_y_tree,ltree,rtree))
 
-            # create the node having x_median as val, and the the given Y-Tree, left and right subtrees
-            root = self._XTreeNode(x_median,merged_y_tree,ltree,rtree)
-            return root                                         # return root
+        return built[0]                                             # return root
     
 
     # ---------------------- bst creation function completed -----------------------------
@@ -197,43 +337,61 @@ class PointDatabase:
         """Range query for Y-Tree (1d Range Query)"""
         # TIME COMPLEXITY : O(m + log(n))
 
+        nodes.extend(self._iter_y_tree(root,rng))
+
+
+    def _iter_y_tree(self,root,rng):
+        """Generator version of _search_y_tree, yields the points as they are found"""
+        # TIME COMPLEXITY : O(m + log(n))
+
         s_node = self._find_split_node(root,rng[1],rng[2],1)            # find the split node
 
         if s_node == None:                                              # Base case
             return
         
-        if self._check_y_range(s_node.val[1],rng):                      # if val at split node lies within the range then append it to nodes list
-            nodes.append(s_node.val)
+        if self._check_y_range(s_node.val[1],rng):                      # if val at split node lies within the range then report it
+            yield s_node.val
         
         v = s_node.left                                                 # search in left subtree of split_node
         while not self._check_leaf_node(v):
-            if self._check_y_range(v.val[1],rng):                       # if current point lies in y range then search the right subtree of Y-Tree
-                nodes.append(v.val)
-                self._search_y_tree(v.right,rng,nodes)
+            if self._check_y_range(v.val[1],rng):                       # if current point lies in y range then report the right subtree of Y-Tree
+                yield v.val
+                yield from self._iter_subtree(v.right)                  # whole right subtree lies in the y range
                 v = v.left                                              # and then move left
             else:                                                       # else move right
                 v = v.right
         
         if v != None and self._check_y_range(v.val[1],rng):             # check leaf node
-            nodes.append(v.val)
+            yield v.val
         
         v = s_node.right                                                # search in right subtree of split_node
         while not self._check_leaf_node(v):
-            if self._check_y_range(v.val[1],rng):                       # if current point lies in y range then search the left subtree of Y-Tree
-                nodes.append(v.val)
-                self._search_y_tree(v.left,rng,nodes)
+            if self._check_y_range(v.val[1],rng):                       # if current point lies in y range then report the left subtree of Y-Tree
+                yield v.val
+                yield from self._iter_subtree(v.left)                   # whole left subtree lies in the y range
                 v = v.right                                             # and then move right
             else:                                                       # else move left
                 v = v.left
         
         if v != None and self._check_y_range(v.val[1],rng):              # check leaf node
-            nodes.append(v.val)
+            yield v.val
 
 
     def _search_x_tree(self,root,rng,ans):
         """Range Query for X-Tree(2d Range Query)"""
         # TIME COMPLEXITY : O(m + log^2(n))
 
+        ans.extend(self._iter_x_tree(root,rng))
+
+
+    def _iter_x_tree(self,root,rng):
+        """Generator version of _search_x_tree, yields the points as they are found"""
+        # TIME COMPLEXITY : O(m + log^2(n))
+
+        if type(root) == self._FlatTree:
+            yield from self._iter_flat(root,rng)
+            return
+
         s_node = self._find_split_node(root,rng[0],rng[2],0)            # find the split node
 
         if s_node == None:                                              # Base case
@@ -241,11 +399,11 @@ class PointDatabase:
 
         if self._check_leaf_node(s_node):                               # Base case
             if self._check_in_range(s_node.val,rng):
-                ans.append(s_node.val)
+                yield s_node.val
             return
         
-        if self._check_in_range(s_node.val,rng):                        # if val at split node is in range then append it to ans
-            ans.append(s_node.val)
+        if self._check_in_range(s_node.val,rng):                        # if val at split node is in range then report it
+            yield s_node.val
 
         # Search in the left subtree of split node
         v = s_node.left
@@ -254,10 +412,10 @@ class PointDatabase:
             # if current point is greater than the lower limit of x then check if this point is in range and then search the right subtree of this node
             if rng[0]-rng[2]<=v.val[0]:
                 if self._check_in_range(v.val,rng):
-                    ans.append(v.val)
+                    yield v.val
                 # Search on Y- Tree for the right subtree of v
                 if v.right != None:
-                    self._search_y_tree(v.right.ytree,rng,ans)
+                    yield from self._iter_y_tree(v.right.ytree,rng)
                 v = v.left                                  # move towards left
             
             else:                               # else move right
@@ -265,7 +423,7 @@ class PointDatabase:
         
         # check if the leaf node is within range
         if v != None and self._check_in_range(v.val,rng):
-            ans.append(v.val)
+            yield v.val
         
 
         # Search in the right subtree of split node
@@ -275,30 +433,914 @@ class PointDatabase:
             # if current point is lesser than the upper limit of x then check if this point is in range and then search the left subtree of this node
             if rng[0]+rng[2]>=v.val[0]:
                 if self._check_in_range(v.val,rng):
-                    ans.append(v.val)
+                    yield v.val
                 # Search on Y- Tree for the left subtree of v
                 if v.left != None:
-                    self._search_y_tree(v.left.ytree,rng,ans)
+                    yield from self._iter_y_tree(v.left.ytree,rng)
                 v = v.right                             # move towards right
             
             else:                               # else move left
                 v = v.left
         # check if the leaf node is within range
         if v != None and self._check_in_range(v.val,rng):
-            ans.append(v.val)
+            yield v.val
+
+
+    def _search_y_tree_radius(self,root,rng,x_lo,x_hi,ans):
+        """Euclidean Range Query for the Y-Tree of a subtree whose points have x in [x_lo,x_hi]"""
+        # The points of the subtree are at least min_dx away from q in x, so only those within
+        # h = sqrt(r^2 - min_dx^2) of q in y can be in the circle. The walk is the one of
+        # _iter_y_tree with the circle check inline, and the subtrees hanging off the path are
+        # collected by _collect_radius without a check when they lie inside the circle.
+        # TIME COMPLEXITY : O(m + log(n))
+
+        qx, qy, r = rng
+        r2 = r*r
+        band = self._radius_y_band(rng,x_lo,x_hi)
+        if band == None:
+            return
+        h, inside2 = band
+
+        s_node = self._find_split_node(root,qy,h,1)                     # find the split node
+        if s_node == None:
+            return
+        s_dy = s_node.val[1]-qy
+        if (s_node.val[0]-qx)**2 + s_dy*s_dy <= r2:
+            ans.append(s_node.val)
+
+        v = s_node.left                                                 # search in left subtree of split_node
+        while v != None:
+            pt = v.val
+            dy = pt[1]-qy
+            if -h <= dy:                                                # the right subtree of v has y in [v.y, split.y]
+                if (pt[0]-qx)**2 + dy*dy <= r2:
+                    ans.append(pt)
+                if v.right != None:
+                    self._collect_radius(v.right,rng,ans,max(dy*dy,s_dy*s_dy) > inside2)
+                v = v.left
+            else:
+                v = v.right
+
+        v = s_node.right                                                # search in right subtree of split_node
+        while v != None:
+            pt = v.val
+            dy = pt[1]-qy
+            if dy <= h:                                                 # the left subtree of v has y in [split.y, v.y]
+                if (pt[0]-qx)**2 + dy*dy <= r2:
+                    ans.append(pt)
+                if v.left != None:
+                    self._collect_radius(v.left,rng,ans,max(dy*dy,s_dy*s_dy) > inside2)
+                v = v.right
+            else:
+                v = v.left
+
+
+    def _radius_y_band(self,rng,x_lo,x_hi):
+        """Return (h, inside2) for points with x in [x_lo,x_hi] and the circle rng, None if they are all outside"""
+        # Only the points within h of q in y can be in the circle, and the points with
+        # (y-qy)^2 <= inside2 are all in it
+        # TIME COMPLEXITY : O(1)
+
+        qx, qy, r = rng
+        if x_lo <= qx <= x_hi:
+            min_dx = 0
+        else:
+            min_dx = min(abs(x_lo-qx),abs(x_hi-qx))
+        r2 = r*r
+        h2 = r2 - min_dx*min_dx
+        if h2 < 0:
+            return None
+        h = math.sqrt(h2)*(1+1e-12)                                     # widened against rounding, every point is checked exactly
+        max_dx = max(abs(x_lo-qx),abs(x_hi-qx))
+        return h, r2 - max_dx*max_dx
+
+
+    def _collect_radius(self,root,rng,ans,check):
+        """Append the points of the subtree at root to ans, only those in the circle rng if check"""
+        # TIME COMPLEXITY : O(size of the subtree)
+
+        stack = [root]
+        if not check:                                                   # the whole subtree is in the circle
+            while stack:
+                node = stack.pop()
+                if node != None:
+                    ans.append(node.val)
+                    stack.append(node.left)
+                    stack.append(node.right)
+            return
+
+        qx, qy, r = rng
+        r2 = r*r
+        while stack:
+            node = stack.pop()
+            if node != None:
+                pt = node.val
+                if (pt[0]-qx)**2 + (pt[1]-qy)**2 <= r2:
+                    ans.append(pt)
+                stack.append(node.left)
+                stack.append(node.right)
+
+
+    def _search_x_tree_radius(self,root,rng,ans):
+        """Euclidean Range Query for X-Tree, rng = (x,y,r)"""
+        # Same traversal as _search_x_tree. The x extent of every canonical subtree is known
+        # from the path (it lies between v and the split node), which narrows its y range.
+        # TIME COMPLEXITY : O(m + log^2(n))
+
+        if type(root) == self._FlatTree:
+            self._search_flat_radius(root,rng,ans)
+            return
+
+        qx, qy, r = rng
+        r2 = r*r
+        s_node = self._find_split_node(root,qx,r,0)                     # find the split node
+
+        if s_node == None:                                              # Base case
+            return
+
+        s_x = s_node.val[0]
+        if (s_x-qx)**2 + (s_node.val[1]-qy)**2 <= r2:
+            ans.append(s_node.val)
+
+        # Search in the left subtree of split node
+        v = s_node.left
+        while v != None:
+            pt = v.val
+            if qx-r <= pt[0]:
+                if (pt[0]-qx)**2 + (pt[1]-qy)**2 <= r2:
+                    ans.append(pt)
+                if v.right != None:                                     # right subtree of v has x in [v.x, s_node.x]
+                    self._search_y_tree_radius(v.right.ytree,rng,pt[0],s_x,ans)
+                v = v.left
+            else:
+                v = v.right
+
+        # Search in the right subtree of split node
+        v = s_node.right
+        while v != None:
+            pt = v.val
+            if pt[0] <= qx+r:
+                if (pt[0]-qx)**2 + (pt[1]-qy)**2 <= r2:
+                    ans.append(pt)
+                if v.left != None:                                      # left subtree of v has x in [s_node.x, v.x]
+                    self._search_y_tree_radius(v.left.ytree,rng,s_x,pt[0],ans)
+                v = v.right
+            else:
+                v = v.left
+
+
+    def _iter_y_from(self,root,y_coord,up):
+        """Yield the points of the Y-Tree with y >= y_coord in increasing y if up, those with y < y_coord in decreasing y else"""
+        # In order walk started at the first node on the wanted side of y_coord
+        # TIME COMPLEXITY : O(log(n)) for the first point, O(1) amortized for the next ones
+
+        stack = []
+        v = root
+        while v != None:
+            if (v.val[1] >= y_coord) == up:                             # v is on the wanted side
+                stack.append(v)
+                v = v.left if up else v.right
+            else:
+                v = v.right if up else v.left
+        while stack:
+            v = stack.pop()
+            yield v.val
+            w = v.right if up else v.left
+            while w != None:
+                stack.append(w)
+                w = w.left if up else w.right
+
+
+    def _nearest_cursors(self,root,q,r):
+        """Return the cursors over the points of the X-Tree with x in [q.x-r,q.x+r] for the best-first search of nearest"""
+        # A cursor is (min_dx2, points): points yields the points of a canonical subtree on one
+        # side of q.y moving away from q.y, and min_dx2 is the squared x distance from q to the x
+        # extent of the subtree (known from the path as in _search_x_tree_radius), so that
+        # min_dx2 + (y-q.y)^2 is a lower bound for the distance of the point yielded and of all
+        # the ones after it. The vals of the path nodes are cursors of a single point.
+        # TIME COMPLEXITY : O(log(n)) cursors, built in O(log(n)) without their first point
+
+        qx, qy = q[0], q[1]
+        cursors = []
+
+        def subtree(x_lo,x_hi,ups):
+            if x_lo <= qx <= x_hi:
+                min_dx = 0
+            else:
+                min_dx = min(abs(x_lo-qx),abs(x_hi-qx))
+            for points in ups:
+                cursors.append((min_dx*min_dx,points))
+
+        def single(pt):
+            cursors.append(((pt[0]-qx)**2,iter((pt,))))
+
+        if type(root) == self._FlatTree:
+            xs, ys = root.xs, root.ys
+            nodes, singles = self._flat_canonical(root,qx-r,qx+r)
+            for k in singles:
+                single((xs[k],ys[k]))
+            for level,lo,hi in nodes:
+                row = root.levels[level]
+                p = bisect_left(row,qy,lo,hi,key=ys.__getitem__)
+                up = row[p:hi]
+                down = row[lo:p][::-1]
+                subtree(xs[lo],xs[hi-1],(zip(map(xs.__getitem__,up),map(ys.__getitem__,up)),
+                                         zip(map(xs.__getitem__,down),map(ys.__getitem__,down))))
+            return cursors
+
+        s_node = self._find_split_node(root,qx,r,0)                     # find the split node
+        if s_node == None:
+            return cursors
+        single(s_node.val)
+        s_x = s_node.val[0]
+
+        v = s_node.left                                                 # search in left subtree of split node
+        while v != None:
+            if qx-r <= v.val[0]:
+                single(v.val)
+                if v.right != None:                                     # right subtree of v has x in [v.x, s_node.x]
+                    ytree = v.right.ytree
+                    subtree(v.val[0],s_x,(self._iter_y_from(ytree,qy,True),self._iter_y_from(ytree,qy,False)))
+                v = v.left
+            else:
+                v = v.right
+
+        v = s_node.right                                                # search in right subtree of split node
+        while v != None:
+            if v.val[0] <= qx+r:
+                single(v.val)
+                if v.left != None:                                      # left subtree of v has x in [s_node.x, v.x]
+                    ytree = v.left.ytree
+                    subtree(s_x,v.val[0],(self._iter_y_from(ytree,qy,True),self._iter_y_from(ytree,qy,False)))
+                v = v.right
+            else:
+                v = v.left
+        return cursors
+
+
+    def _count_y_below(self,root,y_coord,strict):
+        """Return the number of points in the Y-Tree with y < y_coord (y <= y_coord if not strict)"""
+        # TIME COMPLEXITY : O(log(n))
+
+        count = 0
+        v = root
+        while v != None:
+            if v.val[1] < y_coord or (not strict and v.val[1] == y_coord):
+                # v and its whole left subtree lie below y_coord, so count them and move right
+                count += 1
+                if v.left != None:
+                    count += v.left.size
+                v = v.right
+            else:                                                       # else move left
+                v = v.left
+        return count
+
+
+    def _count_y_tree(self,root,rng):
+        """Count query for Y-Tree (1d Range Count)"""
+        # TIME COMPLEXITY : O(log(n))
+
+        if root == None:
+            return 0
+        return self._count_y_below(root,rng[1]+rng[2],False) - self._count_y_below(root,rng[1]-rng[2],True)
+
+
+    def _count_x_tree(self,root,rng):
+        """Count Query for X-Tree(2d Range Count)"""
+        # Same traversal as _search_x_tree, but the Y-Trees of the canonical subtrees are
+        # only counted instead of being reported
+        # TIME COMPLEXITY : O(log^2(n))
+
+        if type(root) == self._FlatTree:
+            return self._count_flat(root,rng)
+
+        s_node = self._find_split_node(root,rng[0],rng[2],0)            # find the split node
+
+        if s_node == None:                                              # Base case
+            return 0
+
+        count = 0
+        if self._check_in_range(s_node.val,rng):                        # if val at split node is in range then count it
+            count += 1
+
+        if self._check_leaf_node(s_node):                               # Base case
+            return count
+
+        # Count in the left subtree of split node
+        v = s_node.left
+        while not self._check_leaf_node(v):
+            if rng[0]-rng[2]<=v.val[0]:
+                if self._check_in_range(v.val,rng):
+                    count += 1
+                if v.right != None:
+                    count += self._count_y_tree(v.right.ytree,rng)      # whole right subtree of v is within x range
+                v = v.left
+            else:
+                v = v.right
+        if v != None and self._check_in_range(v.val,rng):
+            count += 1
+
+        # Count in the right subtree of split node
+        v = s_node.right
+        while not self._check_leaf_node(v):
+            if rng[0]+rng[2]>=v.val[0]:
+                if self._check_in_range(v.val,rng):
+                    count += 1
+                if v.left != None:
+                    count += self._count_y_tree(v.left.ytree,rng)       # whole left subtree of v is within x range
+                v = v.right
+            else:
+                v = v.left
+        if v != None and self._check_in_range(v.val,rng):
+            count += 1
+
+        return count
+
+
+    def _any_x_tree(self,root,rng):
+        """Return True if any point of the X-Tree lies in the range, False otherwise"""
+        # Same traversal as _count_x_tree, but stops at the first point found. A Y-Tree has a point
+        # within the y range iff its split node exists.
+        # TIME COMPLEXITY : O(log^2(n))
+
+        if type(root) == self._FlatTree:
+            return self._any_flat(root,rng)
+
+        s_node = self._find_split_node(root,rng[0],rng[2],0)            # find the split node
+
+        if s_node == None:                                              # Base case
+            return False
+
+        if self._check_in_range(s_node.val,rng):
+            return True
+
+        v = s_node.left                                                 # search in the left subtree of split node
+        while not self._check_leaf_node(v):
+            if rng[0]-rng[2]<=v.val[0]:
+                if self._check_in_range(v.val,rng):
+                    return True
+                if v.right != None and self._find_split_node(v.right.ytree,rng[1],rng[2],1) != None:
+                    return True
+                v = v.left
+            else:
+                v = v.right
+        if v != None and self._check_in_range(v.val,rng):
+            return True
+
+        v = s_node.right                                                # search in the right subtree of split node
+        while not self._check_leaf_node(v):
+            if rng[0]+rng[2]>=v.val[0]:
+                if self._check_in_range(v.val,rng):
+                    return True
+                if v.left != None and self._find_split_node(v.left.ytree,rng[1],rng[2],1) != None:
+                    return True
+                v = v.right
+            else:
+                v = v.left
+        if v != None and self._check_in_range(v.val,rng):
+            return True
+
+        return False
+
+
+    def _query_many(self,queries,method,arg,processes=1):
+        """Run self.method(q,arg) (returning a list of points) for every q in queries, results in CSR form"""
+        # With processes > 1 the sorted queries are split into chunks, answered by a process
+        # pool on a copy of the database in the flat layout in shared memory (see _to_shared)
+        # TIME COMPLEXITY : O(Nlog(N)) + cost of the queries
+
+        # process queries in sorted order so that consecutive queries walk the same
+        # paths of the X-Tree, and repeated queries are answered only once
+        order = sorted(range(len(queries)), key=lambda i: queries[i])
+        sorted_queries = [queries[i] for i in order]
+
+        if processes <= 1 or len(queries) < 2*processes:
+            answers = self._answer_sorted(sorted_queries,method,arg)
+        else:
+            size = -(-len(queries)//(4*processes))                      # 4 chunks per process
+            tasks = [(method,arg,sorted_queries[i:i+size]) for i in range(0,len(queries),size)]
+            shm = self._to_shared()
+            try:
+                with multiprocessing.Pool(processes,_attach_database,(shm.name,)) as pool:
+                    answers = [ans for chunk in pool.map(_query_many_worker,tasks) for ans in chunk]
+            finally:
+                shm.close()
+                shm.unlink()
+
+        per_query = [None] * len(queries)
+        for i, ans in zip(order,answers):
+            per_query[i] = ans
+
+        # flatten the per query results in the original query order
+        offsets = [0]
+        indices = []
+        for ans in per_query:
+            indices.extend(ans)
+            offsets.append(len(indices))
+
+        return offsets, indices
+
+
+    def _answer_sorted(self,queries,method,arg):
+        """Return the point indices of self.method(q,arg) for the sorted queries, a list per query"""
+        # TIME COMPLEXITY : cost of the distinct queries
+
+        query = getattr(self,method)
+        answers = []
+        prev_q = prev_ans = None
+        for q in queries:
+            if prev_ans == None or q[0] != prev_q[0] or q[1] != prev_q[1]:
+                prev_q, prev_ans = q, self._point_indices(query(q,arg))
+            answers.append(prev_ans)
+        return answers
+
+
+    def _point_indices(self,points):
+        """Map the points reported by a single query to their indices in the sorted pointlist"""
+        # Duplicate points are adjacent in the sorted pointlist, so the i-th copy of a point
+        # reported by a query is mapped to (index of first copy + i)
+        # TIME COMPLEXITY : O(m)
+
+        if self._pointlist == None:                                     # the point set changed since the last build
+            self._pointlist = self._live_points()
+            self._first_index = None
+
+        if self._first_index == None:                                   # build the map on first use
+            self._first_index = {}
+            for i in range(len(self._pointlist)-1,-1,-1):
+                self._first_index[self._pointlist[i]] = i
+
+        first_index = self._first_index
+        if len(first_index) == len(self._pointlist):                    # no duplicate points
+            return [first_index[pt] for pt in points]
+
+        seen = {}
+        indices = []
+        for pt in points:
+            copies = seen.get(pt,0)
+            indices.append(first_index[pt]+copies)
+            seen[pt] = copies+1
+        return indices
+
+
+    def _search_all(self,rng,ans,search=None):
+        """Range Query over all the X-Trees of the database, skipping deleted points"""
+        # search is the query function for a single X-Tree, _search_x_tree by default
+        # TIME COMPLEXITY : O(m + log^3(n))
+
+        if search == None:
+            search = self._search_x_tree
+
+        for bucket in self._buckets:
+            search(bucket[1],rng,ans)
+
+        if self._n_deleted == 0:
+            return
+
+        # find the deleted copies lying in the range and drop as many copies from ans
+        dead = []
+        for bucket in self._deleted:
+            search(bucket[1],rng,dead)
+        if not dead:
+            return
+
+        to_remove = {}
+        for pt in dead:
+            to_remove[pt] = to_remove.get(pt,0)+1
+        live = []
+        for pt in ans:
+            if to_remove.get(pt,0) > 0:
+                to_remove[pt] -= 1
+            else:
+                live.append(pt)
+        ans[:] = live
+
+
+    def _count_all(self,rng):
+        """Count Query over all the X-Trees of the database, skipping deleted points"""
+        # TIME COMPLEXITY : O(log^3(n))
+
+        count = 0
+        for bucket in self._buckets:
+            count += self._count_x_tree(bucket[1],rng)
+        for bucket in self._deleted:
+            count -= self._count_x_tree(bucket[1],rng)
+        return count
 
 
     # ---------------------- Search functions completed --------------------------------------
 
+    # ------------------------- Flat layout functions ----------------------------------------
+
+
+    _HEADER = struct.Struct('<4sIIQc11x')                   # magic, version, levels, n, typecode
+    _MAGIC = b'A3PD'
+    _VERSION = 1
+
+
+    def _build_flat(self,points,processes=1):
+        """Build the flat layout (_FlatTree) of the 2d Range Tree on the sorted points"""
+        # The Y-Tree of the X-Tree node covering [lo,hi) is built by stably splitting the y-sorted
+        # indices of its parent around the median mid, so every level takes O(n) time.
+        # With processes > 1 the top levels are built here, and the subtrees below them are
+        # built by a process pool directly into a shared memory buffer, starting from the y-order
+        # of their points computed here.
+        # TIME COMPLEXITY : O(nlog(n))
+
+        n = len(points)
+        xs = [pt[0] for pt in points]
+        ys = [pt[1] for pt in points]
+        typecode = self._typecode(xs,ys)
+        xs = array(typecode,xs)
+        ys = array(typecode,ys)
+        n_levels = n.bit_length()                                       # height of the X-Tree
+
+        order = sorted(range(n), key=ys.__getitem__)                    # y-sorted indices of the root
+        segments = [(0,n)] if n else []
+
+        if processes <= 1 or n < 2*processes:
+            levels = [array('q',bytes(8*n)) for _ in range(n_levels)]
+            _fill_levels(order,0,segments,levels,0,n_levels)
+            return self._FlatTree(xs,ys,levels)
+
+        levels_shm = shared_memory.SharedMemory(create=True,size=8*n*n_levels)
+        try:
+            rows = levels_shm.buf.cast('q')
+            shared_levels = [rows[l*n:(l+1)*n] for l in range(n_levels)]
+
+            # build the top levels until there are enough subtrees to keep every process busy
+            level = 0
+            while segments and len(segments) < 4*processes:
+                order, segments = _fill_levels(order,0,segments,shared_levels,level,level+1)
+                level += 1
+
+            # the first row of every subtree is its y-order, which its worker starts from
+            for lo,hi in segments:
+                shared_levels[level][lo:hi] = array('q',order[lo:hi])
+            tasks = [(levels_shm.name,n,n_levels,level,lo,hi) for lo,hi in segments]
+            with multiprocessing.Pool(processes) as pool:
+                pool.map(_fill_levels_worker,tasks)
+
+            levels = []
+            row = None
+            for row in shared_levels:                                   # copy out of the shared memory
+                level_array = array('q')
+                level_array.frombytes(row.cast('B'))                    # one memcpy, not element by element
+                levels.append(level_array)
+        finally:
+            shared_levels = rows = row = None
+            levels_shm.close()
+            levels_shm.unlink()
+
+        return self._FlatTree(xs,ys,levels)
+
+
+    def _flat_sections(self):
+        """Return the header and the arrays of the live points in the flat layout, as saved by save"""
+        # TIME COMPLEXITY : O(1) if the database is a single flat tree, O(nlog(n)) otherwise
+
+        if len(self._buckets) == 1 and self._n_deleted == 0 and type(self._buckets[0][0]) == self._FlatTree:
+            flat = self._buckets[0][0]                          # already in the flat layout
+        else:
+            flat = self._build_flat(self._live_points())
+        header = self._HEADER.pack(self._MAGIC,self._VERSION,len(flat.levels),len(flat),memoryview(flat.xs).format.encode())
+        return [header,flat.xs,flat.ys] + list(flat.levels)
+
+
+    def _to_shared(self):
+        """Return a shared memory block holding the database in the flat layout, see _from_buffer"""
+        # the caller closes and unlinks the block
+        # TIME COMPLEXITY : O(n) + O(_flat_sections)
+
+        sections = [memoryview(section).cast('B') for section in self._flat_sections()]
+        shm = shared_memory.SharedMemory(create=True,size=sum(len(section) for section in sections))
+        start = 0
+        for section in sections:
+            shm.buf[start:start+len(section)] = section
+            start += len(section)
+        sections = None
+        return shm
+
+
+    def _typecode(self,xs,ys):
+        """Return 'q' (int64) if all coordinates are ints that fit in 8 bytes, 'd' (double) otherwise"""
+        # the checks run over the whole lists in C (set of types, min and max)
+        # TIME COMPLEXITY : O(n)
+
+        if not xs:
+            return 'q'
+        if not set(map(type,xs)) | set(map(type,ys)) <= {int}:
+            return 'd'
+        if -2**63 <= min(min(xs),min(ys)) and max(max(xs),max(ys)) < 2**63:
+            return 'q'
+        return 'd'
+
+
+    def _flat_canonical(self,flat,x_lo,x_hi):
+        """Split the points of the flat tree with x in [x_lo,x_hi] into canonical nodes"""
+        # The X-Tree node at a level covering [lo,hi) has the point mid = (lo+hi)//2 as val and
+        # the children [lo,mid) and [mid+1,hi) one level below. The x range is the index range
+        # [a,b) of the x-sorted points. Returns the nodes inside [a,b) as (level,lo,hi), whose
+        # points sorted by y are levels[level][lo:hi], and the vals of the nodes on the two
+        # boundary paths lying in [a,b). Only integers are pushed on the stack, no node objects.
+        # TIME COMPLEXITY : O(log(n))
+
+        a = bisect_left(flat.xs,x_lo)
+        b = bisect_right(flat.xs,x_hi)
+        nodes = []
+        singles = []
+        stack = [(0,0,len(flat.xs))] if a < b else []
+        while stack:
+            level, lo, hi = stack.pop()
+            if a <= lo and hi <= b:                                     # canonical node
+                nodes.append((level,lo,hi))
+                continue
+            mid = (lo+hi)//2
+            if a <= mid < b:
+                singles.append(mid)
+            if lo < mid and a < mid:                                    # left child overlaps [a,b)
+                stack.append((level+1,lo,mid))
+            if mid+1 < hi and mid+1 < b:                                # right child overlaps [a,b)
+                stack.append((level+1,mid+1,hi))
+        return nodes, singles
+
+
+    def _flat_y_range(self,flat,level,lo,hi,y_lo,y_hi):
+        """Return the range [i,j) of levels[level] of the points of node (level,lo,hi) with y in [y_lo,y_hi]"""
+        # TIME COMPLEXITY : O(log(n))
+
+        row = flat.levels[level]
+        i = bisect_left(row,y_lo,lo,hi,key=flat.ys.__getitem__)
+        j = bisect_right(row,y_hi,i,hi,key=flat.ys.__getitem__)
+        return i, j
+
+
+    def _iter_flat(self,flat,rng):
+        """Range Query for the flat tree, yields the points as they are found"""
+        # TIME COMPLEXITY : O(m + log^2(n))
+
+        xs, ys = flat.xs, flat.ys
+        y_lo, y_hi = rng[1]-rng[2], rng[1]+rng[2]
+        nodes, singles = self._flat_canonical(flat,rng[0]-rng[2],rng[0]+rng[2])
+        for k in singles:
+            if y_lo <= ys[k] <= y_hi:
+                yield (xs[k],ys[k])
+        for level,lo,hi in nodes:
+            i, j = self._flat_y_range(flat,level,lo,hi,y_lo,y_hi)
+            if i < j:
+                ids = flat.levels[level][i:j]
+                yield from zip(map(xs.__getitem__,ids),map(ys.__getitem__,ids))
+
+
+    def _count_flat(self,flat,rng):
+        """Count Query for the flat tree"""
+        # TIME COMPLEXITY : O(log^2(n))
+
+        ys = flat.ys
+        y_lo, y_hi = rng[1]-rng[2], rng[1]+rng[2]
+        nodes, singles = self._flat_canonical(flat,rng[0]-rng[2],rng[0]+rng[2])
+        count = 0
+        for k in singles:
+            if y_lo <= ys[k] <= y_hi:
+                count += 1
+        for level,lo,hi in nodes:
+            i, j = self._flat_y_range(flat,level,lo,hi,y_lo,y_hi)
+            count += j-i
+        return count
+
+
+    def _any_flat(self,flat,rng):
+        """Return True if any point of the flat tree lies in the range, False otherwise"""
+        # TIME COMPLEXITY : O(log^2(n))
+
+        ys = flat.ys
+        y_lo, y_hi = rng[1]-rng[2], rng[1]+rng[2]
+        nodes, singles = self._flat_canonical(flat,rng[0]-rng[2],rng[0]+rng[2])
+        for k in singles:
+            if y_lo <= ys[k] <= y_hi:
+                return True
+        for level,lo,hi in nodes:
+            i, j = self._flat_y_range(flat,level,lo,hi,y_lo,y_hi)
+            if i < j:
+                return True
+        return False
+
+
+    def _search_flat_radius(self,flat,rng,ans):
+        """Euclidean Range Query for the flat tree, rng = (x,y,r)"""
+        # The x extent of a canonical node is [xs[lo],xs[hi-1]], which narrows its y range as in
+        # _search_y_tree_radius. The points of that range are checked, unless all of them are
+        # inside the circle.
+        # TIME COMPLEXITY : O(m + log^2(n))
+
+        qx, qy, r = rng
+        r2 = r*r
+        xs, ys = flat.xs, flat.ys
+        nodes, singles = self._flat_canonical(flat,qx-r,qx+r)
+        for k in singles:
+            if (xs[k]-qx)**2 + (ys[k]-qy)**2 <= r2:
+                ans.append((xs[k],ys[k]))
+        for level,lo,hi in nodes:
+            band = self._radius_y_band(rng,xs[lo],xs[hi-1])
+            if band == None:
+                continue
+            h, inside2 = band
+            i, j = self._flat_y_range(flat,level,lo,hi,qy-h,qy+h)
+            if i == j:
+                continue
+            ids = flat.levels[level][i:j]
+            if max((ys[ids[0]]-qy)**2,(ys[ids[-1]]-qy)**2) <= inside2:
+                ans.extend(zip(map(xs.__getitem__,ids),map(ys.__getitem__,ids)))
+            else:
+                for k in ids:
+                    x, y = xs[k], ys[k]
+                    if (x-qx)**2 + (y-qy)**2 <= r2:
+                        ans.append((x,y))
+
+
+    def _live_points(self):
+        """Return the sorted list of live points of the database"""
+        # TIME COMPLEXITY : O(nlog(n))
+
+        if self._n_deleted == 0 and len(self._buckets) == 1:
+            return list(self._buckets[0][0])
+        points = []
+        for bucket in self._buckets:
+            points.extend(bucket[0])
+        if self._n_deleted != 0:
+            self._load_counts()
+            points = []
+            for pt in self._counts:
+                points.extend([pt]*self._counts[pt])
+        points.sort()
+        return points
+
+
+    # ----------------------- Dynamic update functions ---------------------------------------
+
+
+    def _set_buckets(self,buckets,size):
+        """Reset the database to the given forest of static X-Trees without deleted points"""
+        # TIME COMPLEXITY : O(1)
+
+        # the database is a forest of static 2d range trees, stored as [sorted points, X-Tree]
+        # in decreasing order of size. Deleted points are kept as tombstones in a second forest.
+        self._buckets = buckets
+        self._deleted = []
+        self._size = size                                       # number of live points
+        self._n_deleted = 0                                     # number of tombstones
+        self._counts = None                                     # point -> number of live copies (built on first update)
+
+        # sorted pointlist, used for reporting point indices (None if it has to be rebuilt)
+        self._pointlist = buckets[0][0] if len(buckets) == 1 else None
+        self._first_index = None                                # point -> index of its first copy in _pointlist (built lazily)
+
+
+    def _forest_insert(self,forest,pt):
+        """Insert pt in the forest of static X-Trees (logarithmic method)"""
+        # forest is a list of [sorted points, X-Tree] in decreasing order of size.
+        # A new tree of size 1 is appended and the last two trees are merged (rebuilt)
+        # while the last but one is not more than twice as large as the last, so there are
+        # O(log(n)) trees and every point is rebuilt O(log(n)) times.
+        # TIME COMPLEXITY : O(log^2(n)) amortized
+
+        forest.append([[pt], self._build_x_tree([pt])])
+        while len(forest) > 1 and len(forest[-2][0]) <= 2*len(forest[-1][0]):
+            small = forest.pop()
+            points = list(forest[-1][0])
+            points.extend(small[0])
+            points.sort()                                               # merge of two sorted runs
+            forest[-1] = [points, self._build_x_tree(points)]
+
+
+    def _load_counts(self):
+        """Build the multiplicity of every point of the database, if not built already"""
+        # TIME COMPLEXITY : O(n)
+
+        if self._counts != None:
+            return
+        self._counts = {}
+        for bucket in self._buckets:
+            for pt in bucket[0]:
+                self._counts[pt] = self._counts.get(pt,0)+1
+        for bucket in self._deleted:
+            for pt in bucket[0]:
+                self._counts[pt] -= 1
+
+
+    def _rebuild(self):
+        """Rebuild the database as a single X-Tree of its live points and forget deleted points"""
+        # TIME COMPLEXITY : O(nlog(n))
+
+        points = []
+        for pt in self._counts:
+            points.extend([pt]*self._counts[pt])
+        points.sort()
+        counts = self._counts                                   # the multiplicities are unchanged
+        self._set_buckets([[points, self._build_x_tree(points)]] if points else [], len(points))
+        self._counts = counts
+
+
+    def _points_changed(self,pt):
+        """Invalidate the cached sorted pointlist and cached queries after pt is inserted/deleted"""
+        # TIME COMPLEXITY : O(1) + O(number of invalidated queries)
+
+        self._pointlist = None
+        self._first_index = None
+        self._cache_invalidate(pt)
+
+
+    # ------------------------- Query cache functions ----------------------------------------
+
+
+    _CACHE_MAX_CELLS = 64                                   # queries covering more cells are invalidated by every update
+
+
+    def _cache_cells(self,rng):
+        """Return the grid cells covered by the square of rng, None if there are too many"""
+        # TIME COMPLEXITY : O(1) + O(number of cells)
+
+        if not (math.isfinite(rng[0]) and math.isfinite(rng[1]) and math.isfinite(rng[2])):
+            return None
+        c = self._cache_cell
+        x_lo, x_hi = math.floor((rng[0]-rng[2])/c), math.floor((rng[0]+rng[2])/c)
+        y_lo, y_hi = math.floor((rng[1]-rng[2])/c), math.floor((rng[1]+rng[2])/c)
+        if (x_hi-x_lo+1)*(y_hi-y_lo+1) > self._CACHE_MAX_CELLS:
+            return None
+        return [(i,j) for i in range(x_lo,x_hi+1) for j in range(y_lo,y_hi+1)]
+
+
+    def _cache_get(self,rng):
+        """Return the cached results for rng (most recently used now), None if not cached"""
+        # TIME COMPLEXITY : O(1)
+
+        entry = self._cache.get(rng)
+        if entry == None:
+            self._cache_stats['misses'] += 1
+            return None
+        self._cache.move_to_end(rng)
+        self._cache_stats['hits'] += 1
+        return entry[0]
+
+
+    def _cache_put(self,rng,results):
+        """Cache the results of rng, evicting the least recently used query if the cache is full"""
+        # TIME COMPLEXITY : O(1) + O(number of cells)
+
+        cells = self._cache_cells(rng)
+        self._cache[rng] = (results,cells)
+        if cells == None:
+            self._cache_wide.add(rng)
+        else:
+            for cell in cells:
+                self._cache_by_cell.setdefault(cell,set()).add(rng)
+
+        if len(self._cache) > self._cache_size:
+            self._cache_drop(next(iter(self._cache)))
+            self._cache_stats['evictions'] += 1
+
+
+    def _cache_drop(self,rng):
+        """Remove the query rng from the cache"""
+        # TIME COMPLEXITY : O(1) + O(number of cells)
+
+        results, cells = self._cache.pop(rng)
+        if cells == None:
+            self._cache_wide.discard(rng)
+            return
+        for cell in cells:
+            keys = self._cache_by_cell[cell]
+            keys.discard(rng)
+            if not keys:
+                self._cache_by_cell.pop(cell)
+
+
+    def _cache_invalidate(self,pt):
+        """Remove the cached queries whose square may contain pt"""
+        # TIME COMPLEXITY : O(1) + O(number of invalidated queries)
+
+        if self._cache == None:
+            return
+        cell = (math.floor(pt[0]/self._cache_cell),math.floor(pt[1]/self._cache_cell))
+        stale = list(self._cache_by_cell.get(cell,()))
+        stale.extend(self._cache_wide)
+        for rng in stale:
+            self._cache_drop(rng)
+        self._cache_stats['invalidations'] += len(stale)
+
+
     # --------------------------- PUBLIC METHODS ----------------------------------------------
 
 
-    def __init__(self,pointlist):
+    def __init__(self,pointlist,processes=None):
         """Creates a 2d Range Tree based on given pointlist"""
 
         # -----------------------------------------------------------------------------------
         # | INPUT                                                                           |
         # | pointlist : List[tuple()] - list of points (x,y)                                |
+        # | processes : int - None (default) builds the X-Tree of nodes. Any int, 1         |
+        # |             included, builds the flat layout instead (as used by save) with     |
+        # |             this many processes, so processes=1 is a serial flat build          |
         # |                                                                                 |
         # | OUTPUT  : None                                                                  |
         # |                                                                                 |
@@ -306,7 +1348,17 @@ class PointDatabase:
         # -----------------------------------------------------------------------------------
 
         pointlist.sort()                                        # sort the given pointlist based on x coordinates
-        self.tree = self._build_x_tree(pointlist)               # build the 2d range tree and store its root at self.tree
+        points = list(pointlist)                                # own copy, the caller may change pointlist later
+        if not points:
+            buckets = []
+        elif processes == None:
+            buckets = [[points, self._build_x_tree(points)]]
+        else:
+            flat = self._build_flat(points,processes)
+            buckets = [[flat, flat]]
+        self._set_buckets(buckets, len(points))
+        self._pointlist = points
+        self._cache = None                                      # query cache, see enableCache
 
 
     def searchNearby(self,q,d):
@@ -325,8 +1377,675 @@ class PointDatabase:
         # -----------------------------------------------------------------------------------
 
         rng = (q[0],q[1],d)                                 # store the parameters of range in a tuple
+
+        if self._cache != None:                             # answer from the cache if possible
+            results = self._cache_get(rng)
+            if results != None:
+                return list(results)
+
         results = []                                        # initialize a empty list
 
-        self._search_x_tree(self.tree, rng, results)        # query the range tree
+        self._search_all(rng, results)                      # query the range trees
+
+        if self._cache != None:
+            self._cache_put(rng, list(results))
 
         return results                                      # return results
+
+
+    def countNearby(self,q,d):
+        """Return the number of points within distance d of q from the pointlist."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | q : (x,y) - tuple (x,y)                                                         |
+        # | d : int   - distance d                                                          |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | count : int - number of points which are within l-infinite distance d from q    |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(log^3(n)) (O(log^2(n)) if there were no updates)            |
+        # -----------------------------------------------------------------------------------
+
+        return self._count_all((q[0],q[1],d))
+
+
+    def anyNearby(self,q,d):
+        """Return True if some point of the pointlist is within distance d of q."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | q : (x,y) - tuple (x,y)                                                         |
+        # | d : int   - distance d                                                          |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | bool : True if a point is within l-infinite distance d from q, False otherwise  |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(log^2(n))                                                   |
+        # -----------------------------------------------------------------------------------
+
+        rng = (q[0],q[1],d)
+        if self._n_deleted != 0:                                # a hit may be a deleted point, so count instead
+            return self._count_all(rng) > 0
+
+        for bucket in self._buckets:
+            if self._any_x_tree(bucket[1],rng):
+                return True
+        return False
+
+
+    def iterNearby(self,q,d):
+        """Yield the points within distance d of q from the pointlist, as they are found."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | q : (x,y) - tuple (x,y)                                                         |
+        # | d : int   - distance d                                                          |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | generator of the points (x,y) which are within l-infinite distance d from q,    |
+        # | the same points as searchNearby                                                 |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(log^2(n)) to the first point and O(m + log^2(n)) in total   |
+        # -----------------------------------------------------------------------------------
+
+        rng = (q[0],q[1],d)
+
+        # deleted copies in the range are found first, and skipped while streaming
+        to_remove = {}
+        for bucket in self._deleted:
+            for pt in self._iter_x_tree(bucket[1],rng):
+                to_remove[pt] = to_remove.get(pt,0)+1
+
+        for bucket in self._buckets:
+            for pt in self._iter_x_tree(bucket[1],rng):
+                if to_remove and to_remove.get(pt,0) > 0:
+                    to_remove[pt] -= 1
+                else:
+                    yield pt
+
+
+    def searchNearbyMany(self,queries,d,processes=1):
+        """Answer searchNearby for every point in queries and return the results in CSR form."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | queries : List[tuple()] - list of N query points (x,y)                          |
+        # | d : int   - distance d                                                          |
+        # | processes : int - number of worker processes. The workers query a copy of the   |
+        # |             database in the flat layout (as written by save) in shared memory   |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | offsets : List[int] - N+1 offsets, results of queries[i] are                    |
+        # |           indices[offsets[i]:offsets[i+1]]                                      |
+        # | indices : List[int] - flat list of indices into the (sorted) pointlist          |
+        # |           (into the sorted list of current points after insert/delete)          |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(Nlog(N) + M + Nlog^2(n)), M = total number of results       |
+        # -----------------------------------------------------------------------------------
+
+        return self._query_many(queries,'searchNearby',d,processes)
+
+
+    def searchRadius(self,q,r):
+        """Return the points within euclidean distance r of q from the pointlist."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | q : (x,y) - tuple (x,y)                                                         |
+        # | r : int   - radius r                                                            |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | results : List[tuple()] - List of points (x,y) which are within euclidean       |
+        # | distance r from q                                                               |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(m + log^2(n))                                               |
+        # -----------------------------------------------------------------------------------
+
+        results = []
+        self._search_all((q[0],q[1],r), results, self._search_x_tree_radius)
+        return results
+
+
+    def searchRadiusMany(self,queries,r):
+        """Answer searchRadius for every point in queries and return the results in CSR form."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | queries : List[tuple()] - list of N query points (x,y)                          |
+        # | r : int   - radius r                                                            |
+        # |                                                                                 |
+        # | OUTPUT  : offsets, indices - same as searchNearbyMany                           |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(Nlog(N) + M + Nlog^2(n)), M = total number of results       |
+        # -----------------------------------------------------------------------------------
+
+        return self._query_many(queries,'searchRadius',r)
+
+
+    def nearest(self,q,k):
+        """Return the k points of the pointlist nearest to q (euclidean distance)."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | q : (x,y) - tuple (x,y)                                                         |
+        # | k : int   - number of points                                                    |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | results : List[tuple()] - the min(k,n) nearest points, nearest first            |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(klog(n) + log^3(n)) expected for well spread points         |
+        # -----------------------------------------------------------------------------------
+
+        if k <= 0 or self._size == 0:
+            return []
+
+        # find a l-infinite distance d whose square around q has at least k points: start from the
+        # half side of the square holding k points if they were spread evenly over the x extent
+        # of the database, double it until the square has k points and shrink it once if it has
+        # many more (one or two countNearby calls for well spread points). The k nearest points
+        # are in the circle of radius d*sqrt(2) around q, as the k points of the square are.
+        x_lo = min(bucket[0][0][0] for bucket in self._buckets)
+        x_hi = max(bucket[0][len(bucket[0])-1][0] for bucket in self._buckets)
+        d = (x_hi-x_lo)*math.sqrt(k/self._size)/2
+        if d == 0:
+            pt = self._buckets[0][0][len(self._buckets[0][0])//2]
+            d = max(abs(pt[0]-q[0]),abs(pt[1]-q[1]),1e-9)
+        count = self.countNearby(q,d)
+        while count < k and count < self._size:
+            d *= 2
+            count = self.countNearby(q,d)
+        if count > 4*k:
+            new_d = d*math.sqrt(2*k/count)
+            if self.countNearby(q,new_d) >= k:
+                d = new_d
+
+        # best-first search over the canonical subtrees of the x range [q.x-r,q.x+r]: a heap of
+        # cursors keyed by the lower bound of their next point, and a bounded max-heap of the k
+        # best points found so far. It stops when no cursor can beat the k-th best point.
+        r = d*math.sqrt(2)*(1+1e-12)
+        qx, qy = q[0], q[1]
+        tie = 0                                                         # keeps the heaps from comparing cursors
+        frontier = []
+        for bucket in self._buckets:
+            for min_dx2, points in self._nearest_cursors(bucket[1],q,r):
+                pt = next(points,None)
+                if pt != None:
+                    tie += 1
+                    frontier.append((min_dx2+(pt[1]-qy)**2,tie,min_dx2,pt,points))
+        heapq.heapify(frontier)
+
+        live = self._counts if self._n_deleted != 0 else None          # the copies past the live count are tombstones
+        taken = {}
+        best = []                                                       # (-dist2, tie, pt), at most k of them
+        worst = math.inf                                                # dist2 of the k-th best point once there are k
+        while frontier:
+            bound, _, min_dx2, pt, points = frontier[0]
+            if bound >= worst:
+                break
+            if live == None or taken.get(pt,0) < live.get(pt,0):
+                if live != None:
+                    taken[pt] = taken.get(pt,0)+1
+                dist2 = (pt[0]-qx)**2 + (pt[1]-qy)**2
+                if dist2 < worst:
+                    tie += 1
+                    if len(best) < k:
+                        heapq.heappush(best,(-dist2,tie,pt))
+                        if len(best) == k:
+                            worst = -best[0][0]
+                    else:
+                        heapq.heapreplace(best,(-dist2,tie,pt))
+                        worst = -best[0][0]
+            nxt = next(points,None)                                     # advance the cursor
+            if nxt == None:
+                heapq.heappop(frontier)
+            else:
+                tie += 1
+                heapq.heapreplace(frontier,(min_dx2+(nxt[1]-qy)**2,tie,min_dx2,nxt,points))
+
+        best.sort(reverse=True)
+        return [pt for _,_,pt in best]
+
+
+    def nearestMany(self,queries,k):
+        """Answer nearest for every point in queries and return the results in CSR form."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | queries : List[tuple()] - list of N query points (x,y)                          |
+        # | k : int   - number of points                                                    |
+        # |                                                                                 |
+        # | OUTPUT  : offsets, indices - same as searchNearbyMany, nearest first            |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(Nlog(N) + N(klog(n) + log^3(n)))                            |
+        # -----------------------------------------------------------------------------------
+
+        return self._query_many(queries,'nearest',k)
+
+
+    def insert(self,pt):
+        """Insert the point pt in the database."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | pt : (x,y) - tuple (x,y)                                                        |
+        # |                                                                                 |
+        # | OUTPUT  : None                                                                  |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(log^2(n)) amortized                                         |
+        # -----------------------------------------------------------------------------------
+
+        self._load_counts()
+        self._forest_insert(self._buckets, pt)
+        self._counts[pt] = self._counts.get(pt,0)+1
+        self._size += 1
+        self._points_changed(pt)
+
+
+    def delete(self,pt):
+        """Delete one copy of the point pt from the database."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | pt : (x,y) - tuple (x,y)                                                        |
+        # |                                                                                 |
+        # | OUTPUT  : None                                                                  |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(log^2(n)) amortized                                         |
+        # -----------------------------------------------------------------------------------
+
+        self._load_counts()
+        if self._counts.get(pt,0) == 0:                         # if pt is not present in the database
+            raise ValueError("Point not in database")           # raise error
+
+        self._counts[pt] -= 1
+        if self._counts[pt] == 0:
+            self._counts.pop(pt)
+        self._size -= 1
+
+        # the copy stays in its X-Tree and is cancelled by a tombstone, once the tombstones
+        # outnumber the live points the whole database is rebuilt
+        self._forest_insert(self._deleted, pt)
+        self._n_deleted += 1
+        if self._n_deleted > self._size:
+            self._rebuild()
+        self._points_changed(pt)
+
+
+    def save(self,path):
+        """Save the database to the file at path in the flat layout."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | path : str - path of the file                                                   |
+        # |                                                                                 |
+        # | OUTPUT  : None                                                                  |
+        # |                                                                                 |
+        # | The file has a header followed by the x and y coordinates of the sorted points  |
+        # | and one array of n point indices per level of the X-Tree (all 8 byte values),   |
+        # | which is queried directly by PointDatabase.load                                 |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(nlog(n))                                                    |
+        # -----------------------------------------------------------------------------------
+
+        with open(path,'wb') as f:
+            for section in self._flat_sections():
+                f.write(section)
+
+
+    @classmethod
+    def load(cls,path):
+        """Load a database saved by save, querying the mmap of the file directly."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | path : str - path of the file                                                   |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | PointDatabase - database backed by the read only mmap of the file, which is     |
+        # | shared between all the processes loading the same file                          |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(1)                                                          |
+        # -----------------------------------------------------------------------------------
+
+        with open(path,'rb') as f:
+            buf = memoryview(mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ))
+        return cls._from_buffer(buf)
+
+
+    @classmethod
+    def _from_buffer(cls,buf):
+        """Return a database querying buf, which holds a database in the layout written by save"""
+        # TIME COMPLEXITY : O(1)
+
+        magic, version, n_levels, n, typecode = cls._HEADER.unpack_from(buf)
+        if magic != cls._MAGIC or version != cls._VERSION:
+            raise ValueError("Not a PointDatabase file")
+        typecode = typecode.decode()
+
+        def section(i,code):                                    # i-th array of n values after the header
+            start = cls._HEADER.size + 8*n*i
+            return buf[start:start+8*n].cast(code)
+
+        flat = cls._FlatTree(section(0,typecode),section(1,typecode),[section(2+i,'q') for i in range(n_levels)])
+
+        db = cls.__new__(cls)
+        db._set_buckets([[flat, flat]] if n else [], n)
+        db._cache = None
+        return db
+
+
+    def enableCache(self,maxsize,cell_size=1):
+        """Cache the results of the last maxsize distinct searchNearby queries."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | maxsize   : int - maximum number of cached queries (0 disables the cache)       |
+        # | cell_size : int - side of the grid cells used for invalidation                  |
+        # |                                                                                 |
+        # | OUTPUT  : None                                                                  |
+        # |                                                                                 |
+        # | Queries are cached on the exact (q,d), so queries snapped to a grid by the      |
+        # | caller hit the cache. The least recently used query is evicted when the cache   |
+        # | is full. An insert/delete of pt only drops the cached queries registered in     |
+        # | the grid cell of pt (and the queries too large to be registered by cells).      |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(1)                                                          |
+        # -----------------------------------------------------------------------------------
+
+        if maxsize <= 0:
+            self._cache = None
+            return
+        self._cache = OrderedDict()                             # (x,y,d) -> (results, cells), in LRU order
+        self._cache_size = maxsize
+        self._cache_cell = cell_size
+        self._cache_by_cell = {}                                # cell -> set of cached queries covering it
+        self._cache_wide = set()                                # cached queries covering too many cells
+        self._cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+
+    def cacheStats(self):
+        """Return the statistics of the query cache."""
+
+        # -----------------------------------------------------------------------------------
+        # | OUTPUT                                                                          |
+        # | dict - number of hits, misses, evictions and invalidations of the cache and     |
+        # | its current size, None if the cache is not enabled                              |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(1)                                                          |
+        # -----------------------------------------------------------------------------------
+
+        if self._cache == None:
+            return None
+        stats = dict(self._cache_stats)
+        stats['size'] = len(self._cache)
+        return stats
+
+
+class PointDatabaseND:
+    """PointDatabase for points with any number of coordinates (d-dimensional range tree)"""
+
+    # A multilevel range tree: the structure for coordinate j is a segment tree over the points
+    # sorted by coordinate j, in which every node has a structure for coordinate j+1 over its
+    # points. The structure for the last two coordinates is a single segment tree whose levels
+    # store the points sorted by the last coordinate with pointers into the next level
+    # (fractional cascading), so the last coordinate needs only one binary search.
+    # All the structures are stored in flat arrays of point indices and pointers.
+
+    class _SortedArray:
+        __slots__ = 'keys','ids'
+        def __init__(self,keys,ids):
+            """Structure for the only coordinate of 1d points"""
+            self.keys = keys                                    # sorted coordinates
+            self.ids = ids                                      # indices of the points in the same order
+
+
+
+    class _CascadeTree:
+        __slots__ = 'keys','last','ids','lptr','rptr'
+        def __init__(self,keys,last,ids,lptr,rptr):
+            """Structure for the last two coordinates"""
+            # keys        : second last coordinate of the points, sorted
+            # last        : last coordinate of the points, sorted (the root level)
+            # ids[L]      : the segment [lo,hi) of level L holds the point indices of the node
+            #               covering keys[lo:hi] sorted by the last coordinate
+            # lptr/rptr[L]: lptr[L][i] is the position in level L+1 of the first point of the
+            #               left child not before ids[L][i], rptr[L][i] the same for right child
+            self.keys = keys
+            self.last = last
+            self.ids = ids
+            self.lptr = lptr
+            self.rptr = rptr
+
+
+
+    class _RangeTree:
+        __slots__ = 'keys','ids','assoc'
+        def __init__(self,keys,ids,assoc):
+            """Structure for a coordinate other than the last two"""
+            self.keys = keys                                    # coordinate of the points, sorted
+            self.ids = ids                                      # indices of the points in the same order
+            self.assoc = assoc                                  # node id -> structure for the next coordinate
+
+
+
+    # -------------------- Utility functions ------------------------------------------
+
+
+    def _typecode(self,j):
+        """Return the array typecode for coordinate j, 'q' if all values are int64 else 'd'"""
+        # TIME COMPLEXITY : O(n)
+
+        for pt in self._points:
+            if not (type(pt[j]) == int and -2**63 <= pt[j] < 2**63):
+                return 'd'
+        return 'q'
+
+
+    def _key_range(self,keys,q,d,j,lo=0,hi=None):
+        """Return the range [a,b) of positions of keys within distance d of q[j]"""
+        # TIME COMPLEXITY : O(log(n))
+
+        if hi == None:
+            hi = len(keys)
+        return bisect_left(keys,q[j]-d,lo,hi), bisect_right(keys,q[j]+d,lo,hi)
+
+
+    # ------------------------- Build functions ---------------------------------------
+
+
+    def _build(self,ids,j):
+        """Build the structure for coordinates j.. on the point indices ids sorted by coordinate j"""
+        # TIME COMPLEXITY : O(nlog^(dim-1)(n))
+
+        points = self._points
+        keys = array(self._typecodes[j],[points[i][j] for i in ids])
+
+        if j == self._dim-1:
+            return self._SortedArray(keys,array('q',ids))
+
+        if j == self._dim-2:
+            return self._build_cascade(ids,keys)
+
+        # every node (lo,hi) of the segment tree gets the structure of coordinate j+1 on its points
+        assoc = {}
+        stack = [(1,0,len(ids))]
+        while stack:
+            node, lo, hi = stack.pop()
+            sub = sorted(ids[lo:hi], key=lambda i: points[i][j+1])
+            assoc[node] = self._build(sub,j+1)
+            if hi-lo > 1:
+                mid = (lo+hi)//2
+                stack.append((2*node,lo,mid))
+                stack.append((2*node+1,mid,hi))
+        return self._RangeTree(keys,array('q',ids),assoc)
+
+
+    def _build_cascade(self,ids,keys):
+        """Build the _CascadeTree of the last two coordinates on ids sorted by the second last"""
+        # The level L+1 is made by stably splitting every segment of level L around its middle,
+        # and the pointers count the points of each half met so far.
+        # TIME COMPLEXITY : O(nlog(n))
+
+        points = self._points
+        last = self._dim-1
+        m = len(ids)
+
+        order = sorted(range(m), key=lambda p: points[ids[p]][last])     # positions sorted by last coordinate
+        last_keys = array(self._typecodes[last],[points[ids[p]][last] for p in order])
+
+        levels_ids, levels_lptr, levels_rptr = [], [], []
+        segments = [(0,m)] if m else []
+        while segments:
+            levels_ids.append(array('q',[ids[p] for p in order]))
+            lptr = array('q',bytes(8*m))
+            rptr = array('q',bytes(8*m))
+            next_order = [0]*m
+            next_segments = []
+            for lo,hi in segments:
+                mid = (lo+hi)//2
+                l, r = lo, mid                                  # next free slots of left and right child
+                for i in range(lo,hi):
+                    lptr[i] = l
+                    rptr[i] = r
+                    if order[i] < mid:
+                        next_order[l] = order[i]
+                        l += 1
+                    else:
+                        next_order[r] = order[i]
+                        r += 1
+                if hi-lo > 1:
+                    next_segments.append((lo,mid))
+                    next_segments.append((mid,hi))
+            levels_lptr.append(lptr)
+            levels_rptr.append(rptr)
+            order = next_order
+            segments = next_segments
+
+        return self._CascadeTree(keys,last_keys,levels_ids,levels_lptr,levels_rptr)
+
+
+    # ------------------------- Search functions --------------------------------------
+
+
+    def _query(self,struct,q,d,j,report):
+        """Query the structure of coordinates j.., calling report(ids, start, stop) for the results"""
+        # TIME COMPLEXITY : O(m + log^(dim-1)(n))
+
+        a, b = self._key_range(struct.keys,q,d,j)
+        if a >= b:
+            return
+
+        if type(struct) == self._SortedArray:
+            report(struct.ids,a,b)
+            return
+
+        if type(struct) == self._RangeTree:
+            stack = [(1,0,len(struct.keys))]
+            while stack:
+                node, lo, hi = stack.pop()
+                if hi <= a or b <= lo:                          # node is outside the range
+                    continue
+                if a <= lo and hi <= b:                         # node is inside the range, query next coordinate
+                    self._query(struct.assoc[node],q,d,j+1,report)
+                    continue
+                mid = (lo+hi)//2
+                stack.append((2*node,lo,mid))
+                stack.append((2*node+1,mid,hi))
+            return
+
+        # _CascadeTree: one binary search for the last coordinate at the root, then the
+        # positions are carried down the levels through the pointers
+        pa, pb = self._key_range(struct.last,q,d,j+1)
+        stack = [(0,0,len(struct.keys),pa,pb)]
+        while stack:
+            level, lo, hi, pa, pb = stack.pop()
+            if pa >= pb or hi <= a or b <= lo:                  # no points of the node are in the range
+                continue
+            if a <= lo and hi <= b:                             # node is inside the range, report its points
+                report(struct.ids[level],pa,pb)
+                continue
+            mid = (lo+hi)//2
+            lptr, rptr = struct.lptr[level], struct.rptr[level]
+            stack.append((level+1,lo,mid,lptr[pa] if pa < hi else mid,lptr[pb] if pb < hi else mid))
+            stack.append((level+1,mid,hi,rptr[pa] if pa < hi else hi,rptr[pb] if pb < hi else hi))
+
+
+    # --------------------------- PUBLIC METHODS ----------------------------------------------
+
+
+    def __init__(self,pointlist,dim=None):
+        """Creates a d-dimensional Range Tree based on given pointlist"""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | pointlist : List[tuple()] - list of points, all with dim coordinates            |
+        # | dim : int - number of coordinates (taken from the first point if not given)     |
+        # |                                                                                 |
+        # | OUTPUT  : None                                                                  |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(nlog^(dim-1)(n))                                            |
+        # -----------------------------------------------------------------------------------
+
+        if dim == None:
+            if not pointlist:
+                raise ValueError("dim is required for an empty pointlist")
+            dim = len(pointlist[0])
+        for pt in pointlist:
+            if len(pt) != dim:
+                raise ValueError("All points must have %d coordinates" % dim)
+
+        self._dim = dim
+        self._points = list(pointlist)
+        self._typecodes = [self._typecode(j) for j in range(dim)]
+        ids = sorted(range(len(self._points)), key=lambda i: self._points[i][0])
+        self._root = self._build(ids,0)
+
+
+    def searchNearby(self,q,d):
+        """Return the points within distance d of q from the pointlist."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | q : tuple - query point with dim coordinates                                    |
+        # | d : int   - distance d                                                          |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | results : List[tuple()] - List of points which are within l-infinite            |
+        # | distance d from q                                                               |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(m + log^(dim-1)(n))                                         |
+        # -----------------------------------------------------------------------------------
+
+        points = self._points
+        results = []
+
+        def report(ids,start,stop):
+            for k in range(start,stop):
+                results.append(points[ids[k]])
+
+        self._query(self._root,q,d,0,report)
+        return results
+
+
+    def countNearby(self,q,d):
+        """Return the number of points within distance d of q from the pointlist."""
+
+        # -----------------------------------------------------------------------------------
+        # | INPUT                                                                           |
+        # | q : tuple - query point with dim coordinates                                    |
+        # | d : int   - distance d                                                          |
+        # |                                                                                 |
+        # | OUTPUT                                                                          |
+        # | count : int - number of points which are within l-infinite distance d from q    |
+        # |                                                                                 |
+        # | TIME COMPLEXITY : O(log^(dim-1)(n))                                             |
+        # -----------------------------------------------------------------------------------
+
+        count = [0]
+
+        def report(ids,start,stop):
+            count[0] += stop-start
+
+        self._query(self._root,q,d,0,report)
+        return count[0]
@@ -0,0 +1,274 @@
+"""Benchmarks for PointDatabase (a3.py)
+
+Measures build time, memory per point and searchNearby latency percentiles on
+uniform, clustered, collinear and duplicate heavy point sets, cross-checks the
+results against brute force and prints everything as JSON, e.g.
+
+    python bench_a3.py --sizes 1000 10000 100000 > before.json
+
+so that two commits can be compared. Also times the flat layout build for a
+range of process counts, searchRadius and nearest against box-then-filter
+(one query at a time and through searchRadiusMany / nearestMany) and
+PointDatabaseND for d = 2..4.
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from a3 import PointDatabase, PointDatabaseND
+
+
+SIDE = 10**6                                            # points lie in [0, SIDE]^2
+SELECTIVITIES = [0, 10, 10**4]                          # target number of results per query
+
+
+# ----------------------------- Point sets ------------------------------------
+
+
+def uniform(n, rnd):
+    return [(rnd.randint(0, SIDE), rnd.randint(0, SIDE)) for _ in range(n)]
+
+
+def clustered(n, rnd):
+    # gaussian clusters of about 1000 points each
+    centers = [(rnd.randint(0, SIDE), rnd.randint(0, SIDE)) for _ in range(max(1, n // 1000))]
+    pts = []
+    for _ in range(n):
+        cx, cy = centers[rnd.randrange(len(centers))]
+        pts.append((int(rnd.gauss(cx, SIDE / 200)), int(rnd.gauss(cy, SIDE / 200))))
+    return pts
+
+
+def collinear(n, rnd):
+    # all points on the diagonal, the worst case for the split by x
+    pts = []
+    for _ in range(n):
+        t = rnd.randint(0, SIDE)
+        pts.append((t, t))
+    return pts
+
+
+def duplicates(n, rnd):
+    # every point repeated about 100 times
+    distinct = uniform(max(1, n // 100), rnd)
+    return [distinct[rnd.randrange(len(distinct))] for _ in range(n)]
+
+
+DATASETS = {'uniform': uniform, 'clustered': clustered, 'collinear': collinear, 'duplicates': duplicates}
+
+
+# ------------------------------ Helpers --------------------------------------
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+    return {'p50_us': pick(50) * 1e6, 'p90_us': pick(90) * 1e6, 'p99_us': pick(99) * 1e6,
+            'mean_us': sum(samples) / len(samples) * 1e6}
+
+
+def brute_force(pts, q, d):
+    return sorted(p for p in pts if abs(p[0] - q[0]) <= d and abs(p[1] - q[1]) <= d)
+
+
+def distance_for(db, queries, k):
+    """Return d such that the median number of results of the queries is about k"""
+    if k == 0:
+        return 0
+    lo, hi = 0, SIDE
+    for _ in range(40):
+        mid = (lo + hi) / 2
+        counts = sorted(db.countNearby(q, mid) for q in queries)
+        if counts[len(counts) // 2] < k:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+
+def measure_build(pts, **kwargs):
+    """Return (database, build seconds, bytes held by the database)"""
+    start = time.perf_counter()
+    db = PointDatabase(list(pts), **kwargs)
+    seconds = time.perf_counter() - start
+
+    # build again under tracemalloc, which would distort the timing
+    del db
+    tracemalloc.start()
+    db = PointDatabase(list(pts), **kwargs)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return db, seconds, size
+
+
+# ----------------------------- Benchmarks ------------------------------------
+
+
+def bench_dataset(name, n, args, rnd):
+    pts = DATASETS[name](n, rnd)
+    result = {'dataset': name, 'n': n}
+
+    db, seconds, size = measure_build(pts)
+    result['build_s'] = seconds
+    result['bytes_per_point'] = size / n
+
+    _, seconds, size = measure_build(pts, processes=1)
+    result['flat_build_s'] = seconds
+    result['flat_bytes_per_point'] = size / n
+
+    # queries around random points of the set, so that they hit the clusters
+    queries = [pts[rnd.randrange(n)] for _ in range(args.queries)]
+    result['queries'] = []
+    for k in SELECTIVITIES:
+        if k > n:
+            continue
+        d = distance_for(db, queries[:21], k)
+        times = []
+        total = 0
+        for q in queries:
+            start = time.perf_counter()
+            total += len(db.searchNearby(q, d))
+            times.append(time.perf_counter() - start)
+        entry = {'target_k': k, 'd': d, 'mean_k': total / len(queries)}
+        entry.update(percentiles(times))
+
+        # cross check a few queries against brute force
+        if n <= args.check_limit:
+            for q in queries[:args.checks]:
+                if sorted(db.searchNearby(q, d)) != brute_force(pts, q, d):
+                    raise AssertionError(f'wrong result for {name}, n={n}, q={q}, d={d}')
+            entry['checked'] = min(args.checks, len(queries))
+        result['queries'].append(entry)
+
+    return result
+
+
+def bench_flat_build(n, args, rnd):
+    """Flat layout build time for every process count of --processes"""
+    pts = uniform(n, rnd)
+    results = []
+    for processes in args.processes:
+        start = time.perf_counter()
+        PointDatabase(list(pts), processes=processes)
+        seconds = time.perf_counter() - start
+        results.append({'n': n, 'processes': processes, 'build_s': seconds, 'points_per_s': n / seconds})
+    return results
+
+
+def box_nearest(db, q, k, d):
+    """k nearest points by box queries: double d until the square holds k points, then filter
+    the square around the circle of radius d*sqrt(2), which holds the k nearest"""
+    while len(db.searchNearby(q, d)) < k and d < SIDE:
+        d *= 2
+    box = db.searchNearby(q, d * math.sqrt(2))
+    return heapq.nsmallest(k, box, key=lambda p: (p[0] - q[0])**2 + (p[1] - q[1])**2)
+
+
+def bench_radius(n, args, rnd):
+    """searchRadius and nearest against searchNearby followed by filtering by distance"""
+    pts = uniform(n, rnd)
+    db = PointDatabase(list(pts))
+    queries = [(rnd.randint(0, SIDE), rnd.randint(0, SIDE)) for _ in range(args.queries)]
+    results = []
+    for k in SELECTIVITIES[1:]:
+        if k > n:
+            continue
+        r = SIDE * math.sqrt(k / n / math.pi)           # circle with about k points
+        start = time.perf_counter()
+        for q in queries:
+            db.searchRadius(q, r)
+        radius_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for q in queries:
+            [p for p in db.searchNearby(q, r) if (p[0] - q[0])**2 + (p[1] - q[1])**2 <= r * r]
+        box_s = time.perf_counter() - start
+        start = time.perf_counter()
+        db.searchRadiusMany(queries, r)
+        radius_many_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for q in queries:
+            db.nearest(q, k)
+        nearest_s = time.perf_counter() - start
+        d = SIDE * math.sqrt(k / n) / 2                 # square with about k points
+        start = time.perf_counter()
+        for q in queries:
+            box_nearest(db, q, k, d)
+        box_nearest_s = time.perf_counter() - start
+        start = time.perf_counter()
+        db.nearestMany(queries, k)
+        nearest_many_s = time.perf_counter() - start
+
+        # cross check the distances of nearest against box-then-filter
+        for q in queries[:args.checks]:
+            dist = lambda p: (p[0] - q[0])**2 + (p[1] - q[1])**2
+            if [dist(p) for p in db.nearest(q, k)] != [dist(p) for p in box_nearest(db, q, k, d)]:
+                raise AssertionError(f'wrong nearest for n={n}, q={q}, k={k}')
+
+        per_query = 1e6 / len(queries)
+        results.append({'n': n, 'k': k, 'searchRadius_us': radius_s * per_query,
+                        'box_filter_us': box_s * per_query,
+                        'searchRadiusMany_us': radius_many_s * per_query,
+                        'nearest_us': nearest_s * per_query,
+                        'box_nearest_us': box_nearest_s * per_query,
+                        'nearestMany_us': nearest_many_s * per_query})
+    return results
+
+
+def bench_nd(n, dim, args, rnd):
+    pts = [tuple(rnd.randint(0, SIDE) for _ in range(dim)) for _ in range(n)]
+    start = time.perf_counter()
+    db = PointDatabaseND(pts)
+    build_s = time.perf_counter() - start
+    d = SIDE * (10 / n) ** (1 / dim) / 2                # about 10 results per query
+    queries = [tuple(rnd.randint(0, SIDE) for _ in range(dim)) for _ in range(args.queries)]
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        db.searchNearby(q, d)
+        times.append(time.perf_counter() - start)
+    result = {'dim': dim, 'n': n, 'build_s': build_s, 'd': d}
+    result.update(percentiles(times))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10**3, 10**4, 10**5],
+                        help='number of points (up to 10^7, which takes a long time)')
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--queries', type=int, default=200, help='queries per selectivity level')
+    parser.add_argument('--checks', type=int, default=20, help='queries cross checked against brute force')
+    parser.add_argument('--check-limit', type=int, default=10**5, help='largest n cross checked')
+    parser.add_argument('--nd-size', type=int, default=5000, help='number of points for PointDatabaseND')
+    cpus = os.cpu_count() or 1
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=[1 << i for i in range(cpus.bit_length())] + ([cpus] if cpus & (cpus - 1) else []),
+                        help='process counts of the flat build (default: the powers of two below the cpu count, then the cpu count)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    report = {'python': sys.version.split()[0], 'seed': args.seed, 'cpus': os.cpu_count(),
+              'datasets': [], 'flat_build': [], 'radius': [], 'nd': []}
+    for n in args.sizes:
+        for name in args.datasets:
+            report['datasets'].append(bench_dataset(name, n, args, rnd))
+        report['flat_build'].extend(bench_flat_build(n, args, rnd))
+        report['radius'].extend(bench_radius(n, args, rnd))
+    for dim in (2, 3, 4):
+        report['nd'].append(bench_nd(args.nd_size, dim, args, rnd))
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
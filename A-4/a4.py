@@ -1,47 +1,184 @@
 import random
 import math
+import mmap
+import multiprocessing
+import operator
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+from itertools import compress, count, islice
+from multiprocessing import shared_memory
 
 
 # To generate random prime less than N
 def randPrime(N):
-    primes = []
-    for q in range(2, N+1):
-        if (isPrime(q)):
-            primes.append(q)
-    return primes[random.randint(0, len(primes)-1)]
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | N : upper bound for the prime                                           |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | q : prime chosen uniformly at random from the primes in [2, N]          |
+    # |                                                                         |
+    # | Random integers in [2, N] are drawn until one of them is prime, so      |
+    # | every prime is equally likely. By the prime number theorem about ln(N)  |
+    # | draws are needed, each tested in O(log(N)^3) by isPrime                 |
+    # |                                                                         |
+    # | Time Complexity  : O(log(N)^4) expected                                 |
+    # | Space Complexity : O(log(N))                                            |
+    # ---------------------------------------------------------------------------
+    while True:
+        q = random.randint(2, N)
+        if isPrime(q):
+            return q
+
+
+# Bases for which the Miller-Rabin test is exact for all q < 3.3 * 10^24
+MR_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+MR_LIMIT = 3317044064679887385961981
 
 
 # To check if a number is prime
 def isPrime(q):
-    if (q > 1):
-        for i in range(2, int(math.sqrt(q)) + 1):
-            if (q % i == 0):
-                return False
-        return True
-    else:
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | q : integer                                                             |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | bool : True if q is prime else False                                    |
+    # |                                                                         |
+    # | Miller-Rabin test with the bases MR_BASES, which is deterministic for   |
+    # | q < MR_LIMIT. Larger q are also tested with 20 random bases (error      |
+    # | probability below 4^-20)                                                |
+    # |                                                                         |
+    # | Time Complexity  : O(log(q)^3)                                          |
+    # | Space Complexity : O(log(q))                                            |
+    # ---------------------------------------------------------------------------
+    if q < 2:
         return False
+    for b in MR_BASES:                  # small primes and their multiples
+        if q % b == 0:
+            return q == b
+
+    # write q - 1 = d * 2^s with d odd
+    d = q - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    bases = list(MR_BASES)
+    if q >= MR_LIMIT:
+        bases += [random.randint(2, q - 2) for _ in range(20)]
+
+    for b in bases:
+        x = pow(b, d, q)
+        if x == 1 or x == q - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % q
+            if x == q - 1:
+                break
+        else:
+            return False                # b is a witness that q is composite
+    return True
 
 
 # pattern matching
-def randPatternMatch(eps, p, x):
-    N = findN(eps, len(p))
+def randPatternMatch(eps, p, x, alphabet=None):
+    N = findN(eps, len(p), 26 if alphabet is None else alphabet.base)
     q = randPrime(N)
-    return modPatternMatch(q, p, x)
+    return modPatternMatch(q, p, x, alphabet)
 
 
 # pattern matching with wildcard
-def randPatternMatchWildcard(eps, p, x):
-    N = findN(eps, len(p))
+def randPatternMatchWildcard(eps, p, x, alphabet=None):
+    N = findN(eps, len(parsePattern(p)), 26 if alphabet is None else alphabet.base)
     q = randPrime(N)
-    return modPatternMatchWildcard(q, p, x)
+    return modPatternMatchWildcard(q, p, x, alphabet)
+
+
+# matching of many patterns in one pass per pattern length
+def randMultiPatternMatch(eps, patterns, x, alphabet=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | eps : error bound for a position of x to be falsely reported for any    |
+    # |       of the patterns                                                   |
+    # | patterns : list of patterns                                             |
+    # | x : document                                                            |
+    # | alphabet : Alphabet from makeAlphabet, None for A-Z                     |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : list of the occurence lists of the patterns, in the same order   |
+    # |                                                                         |
+    # | A window of x is compared with up to k = len(patterns) pattern hashes,  |
+    # | so by the union bound the argument of findN applies with eps / k:       |
+    # | k * m * log2(b) / pi(N) <= eps, with m the longest pattern length and b |
+    # | the size of the alphabet                                                |
+    # ---------------------------------------------------------------------------
+    if not patterns:
+        return []
+    m = max(len(p) for p in patterns)
+    N = findN(eps / len(patterns), max(m, 1), 26 if alphabet is None else alphabet.base)
+    q = randPrime(N)
+    return modMultiPatternMatch(q, patterns, x, alphabet)
+
+
+# Mersenne prime 2^61 - 1, the modulus of the random base hashes
+MERSENNE_61 = (1 << 61) - 1
+
+
+# pattern matching modulo MERSENNE_61 with random bases, no prime search
+def randMersennePatternMatch(p, x, hashes=1, verify=False):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | p : pattern (str or bytes)                                              |
+    # | x : document (str or bytes)                                             |
+    # | hashes : 1, or 2 for two independent hashes that must both match        |
+    # | verify : compare the candidates with p directly, so the output is exact |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : as modPatternMatch, false positives with probability at most     |
+    # |        mersenneBound(len(p), len(x) - len(p) + 1, hashes) (0 if verify) |
+    # |                                                                         |
+    # | The modulus is fixed and the randomness is in the base r instead, drawn |
+    # | uniformly from [0, MERSENNE_61). See mersenneBound for the error        |
+    # ---------------------------------------------------------------------------
+    bases = [random.randrange(MERSENNE_61) for _ in range(hashes)]
+    return mersennePatternMatch(bases, p, x, verify)
+
+
+# upper bound for the probability that randMersennePatternMatch reports a false positive
+def mersenneBound(m, windows=1, hashes=1):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | m : length of pattern                                                   |
+    # | windows : number of windows of the document (n - m + 1)                 |
+    # | hashes : number of independent hashes                                   |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | float : bound for the probability of any false positive                 |
+    # |                                                                         |
+    # | Proof: let a and b be the code sequences of p and of a window, a != b.  |
+    # | Their hashes are equal iff r is a root modulo M = MERSENNE_61 of        |
+    # | D(z) = sum_{i=0}^{m-1} (a[i] - b[i]) * z^(m-1-i), a nonzero polynomial  |
+    # | of degree at most m-1 (|a[i] - b[i]| < M). Over the field Z_M it has at |
+    # | most m-1 roots, so for r uniform in Z_M the probability is at most      |
+    # | (m-1)/M. Independent bases multiply, and the union bound over the       |
+    # | windows gives windows * ((m-1)/M)^hashes                                |
+    # ---------------------------------------------------------------------------
+    return min(1.0, windows * (max(m - 1, 0) / MERSENNE_61) ** hashes)
 
 
 # return appropriate N that satisfies the error bounds
-def findN(eps, m):
+def findN(eps, m, base=26):
     # ---------------------------------------------------------------------------
     # | INPUT                                                                   |
     # | eps : error bound                                                       |
     # | m : length of pattern                                                   |
+    # | base : base of the hash, the alphabet size (26 for A-Z, 256 for bytes)  |
     # |                                                                         |
     # | OUTPUT                                                                  |
     # | N : upper bound for random prime                                        |
@@ -58,76 +195,763 @@ def findN(eps, m):
     # | Therefore false positive occurs when a != b , but a mod q == b mod q    |
     # | Thus, q | (a - b)                                                       |
     # |                                                                         |
-    # | a-b is a m bit number in base 26                                        |
-    # | Hence, (a - b) = sum_{i=0}^{m-1} (a[i] - b[i]) * 26^i                   |
-    # | (a - b) <= sum_{i=0}^{m-1} (26) * 26^i = 26^m                           |
+    # | a-b is a m bit number in base 26 (in general in base b = base)          |
+    # | Hence, (a - b) = sum_{i=0}^{m-1} (a[i] - b[i]) * b^i                    |
+    # | (a - b) <= sum_{i=0}^{m-1} (b) * b^i = b^m                              |
     # |                                                                         |
-    # | Number of prime divisors of a-b  = log2(a-b)  <= log2(26^m)             |
+    # | Number of prime divisors of a-b  = log2(a-b)  <= log2(b^m)              |
     # | Thus false positive occurs when q is one of these prime divisors ,      |
-    # | which are at most m*log2(26)                                            |
-    # | Thus probability of false positive is at most m*log2(26)/pi(N)          |
+    # | which are at most m*log2(b)                                             |
+    # | Thus probability of false positive is at most m*log2(b)/pi(N)           |
     # |                                                                         |
-    # | m*log2(26)/pi(N) <= eps      =>       pi(N) >= m*log2(26)/eps           |
+    # | m*log2(b)/pi(N) <= eps      =>       pi(N) >= m*log2(b)/eps             |
     # | We have been given that pi(N) >= N / (2 * log2(N))                      |
-    # | N / (2 * log2(N)) >= m*log2(26)/eps                                     |
+    # | N / (2 * log2(N)) >= m*log2(b)/eps                                      |
     # |                                                                         |
-    # | Consider first approxmation of N = 2 * m * log2(26) / eps               |
+    # | Consider first approxmation of N = 2 * m * log2(b) / eps                |
     # | Now the next approximation is N = N * log2(N) * 10                      |
     # | The multiplication by 10 ensures that N satisfies the above inequality  |
     # | In the end we return int(N) + 1                                         |
     # ---------------------------------------------------------------------------
 
     a = 10
-    N = 2 * math.log2(26) * m / eps
+    N = 2 * math.log2(base) * m / eps
     N = N * math.log2(N) * a
 
     return int(N) + 1
 
 
 # Return sorted list of starting indices where p matches x
-def modPatternMatch(q, p, x):
+def modPatternMatch(q, p, x, alphabet=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | q : prime number                                                        |
+    # | p : pattern (str or bytes)                                              |
+    # | x : document (str or bytes)                                             |
+    # | alphabet : Alphabet from makeAlphabet, None for A-Z as identifier()     |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : indices i where hash(x[i:i+m]) == hash(p)                        |
+    # |                                                                         |
+    # | The document is converted to bytes once, so the rolling hash works on   |
+    # | small ints with no identifier() calls. The removal of the outgoing      |
+    # | character is looked up in a table, leaving one % per character:         |
+    # | new_hash = (prev_hash * 26 + new - out[old]) % q, where                 |
+    # | out[c] = (c - 65) * 26^m + 65, which is the same value as rehash()      |
+    # | With an alphabet the characters are first translated to their digits    |
+    # | (see digits) and the same loop runs with base alphabet.base and no 65   |
+    # |                                                                         |
+    # | Time Complexity  : O(n + m)                                             |
+    # | Space Complexity : O(n + k) for k indexes                               |
+    # ---------------------------------------------------------------------------
+    if alphabet is None:
+        p = codes(p)
+        x = codes(x)
+        base, low = 26, 65              # digit of c is c - low
+    else:
+        p = digits(alphabet, p)
+        x = digits(alphabet, x)
+        base, low = alphabet.base, 0
     m = len(p)
-    # Compute the hash of pattern and pre-compute the value of (26^(m-1) % q) and store it in pre_comp
-    pat_hash, pre_comp = hash(p, 0, m, q)
+    n = len(x)
+    if m > n:
+        return []
+
+    # Compute the hash of pattern and of the first m characters of document
+    pat_hash = 0
+    prev_hash = 0
+    for i in range(m):
+        pat_hash = (pat_hash * base + p[i] - low) % q
+        prev_hash = (prev_hash * base + x[i] - low) % q
+
+    shift = pow(base, m, q)             # base^m % q
+    size = 256 if not isinstance(x, list) else max(max(x), 255) + 1    # codes above 255 in a str
+    out = [((c - low) * shift + low) % q for c in range(size)]
 
-    # Compute the hash of first m characters of document
-    prev_hash, _ = hash(x, 0, m, q)
     occurence_lst = []                  # Initialize list for storing indexes
     if prev_hash == pat_hash:           # check for index 0
         occurence_lst.append(0)
 
-    for i in range(1, len(x)-m+1):
-        # Calculate new hash for document for characters from i to i+m-1
-        new_hash = rehash(x[i+m-1], x[i-1], q, prev_hash, pre_comp)  # rehash
-        if new_hash == pat_hash:
+    # roll the hash over all windows, old and new are the characters leaving and entering it
+    i = 0
+    for old, new in zip(x, x[m:]):
+        i += 1
+        prev_hash = (prev_hash * base + new - out[old]) % q
+        if prev_hash == pat_hash:
             occurence_lst.append(i)     # append to list if hash is equal
-        prev_hash = new_hash            # store the new hash in prev_hash
 
     return occurence_lst                # return list of indexes
 
 
-# Return sorted list of starting indices where p matches x
-def modPatternMatchWildcard(q, p, x):
+# Return sorted list of starting indices where p matches x, hashing modulo MERSENNE_61
+def mersennePatternMatch(bases, p, x, verify=False):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | bases : list of 1 or 2 bases in [0, MERSENNE_61)                        |
+    # | p : pattern (str or bytes)                                              |
+    # | x : document (str or bytes)                                             |
+    # | verify : compare the candidates with p directly                         |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : indices i where every hash of x[i:i+m] equals the one of p       |
+    # |        (and x[i:i+m] == p if verify)                                    |
+    # |                                                                         |
+    # | hash_r(s) = sum_i s[i] * r^(m-1-i) % MERSENNE_61 over the character     |
+    # | codes, rolled as in modPatternMatch. The characters are their own       |
+    # | digits, so any text hashes correctly                                    |
+    # |                                                                         |
+    # | Time Complexity  : O(hashes * (n + m) + k * m if verify)                |
+    # | Space Complexity : O(n + k) for k indexes                               |
+    # ---------------------------------------------------------------------------
+    if len(bases) not in (1, 2):
+        raise ValueError("Only 1 or 2 hashes are supported")
+    M = MERSENNE_61
+    p = codes(p)
+    x = codes(x)
     m = len(p)
-    # Compute the hash of pattern, position of question mark and pre-compute the
-    # value of (26^(m-1) % q), (26^(m-pos-1) % q) then store it in pre_comp1 and pre_comp2
-    pat_hash, q_pos, pre_comp1, pre_comp2 = wildcard_pat_hash(p, 0, m, q)
+    n = len(x)
+    if m > n:
+        return []
 
-    # Compute the hash of first m characters of document
-    prev_hash = wildcard_string_hash(x, 0, m, q, q_pos)
-    occurence_lst = []                  # Initialize list for storing indexes
-    if prev_hash == pat_hash:           # check for index 0
+    size = 256 if not isinstance(x, list) else max(max(x), 255) + 1
+    r1 = bases[0]
+    r2 = bases[-1]                      # same as r1 for a single hash
+    pat1 = pat2 = prev1 = prev2 = 0
+    for i in range(m):
+        pat1 = (pat1 * r1 + p[i]) % M
+        pat2 = (pat2 * r2 + p[i]) % M
+        prev1 = (prev1 * r1 + x[i]) % M
+        prev2 = (prev2 * r2 + x[i]) % M
+    shift1 = pow(r1, m, M)
+    shift2 = pow(r2, m, M)
+    out1 = [c * shift1 % M for c in range(size)]
+    out2 = [c * shift2 % M for c in range(size)]
+
+    occurence_lst = []
+    if prev1 == pat1 and prev2 == pat2:
         occurence_lst.append(0)
+    i = 0
+    if len(bases) == 1:
+        for old, new in zip(x, x[m:]):
+            i += 1
+            prev1 = (prev1 * r1 + new - out1[old]) % M
+            if prev1 == pat1:
+                occurence_lst.append(i)
+    else:
+        for old, new in zip(x, x[m:]):
+            i += 1
+            prev1 = (prev1 * r1 + new - out1[old]) % M
+            prev2 = (prev2 * r2 + new - out2[old]) % M
+            if prev1 == pat1 and prev2 == pat2:
+                occurence_lst.append(i)
 
-    for i in range(1, len(x)-m+1):
-        # Calculate new hash for document for characters i to i+m-1
-        new_hash = wildcard_string_rehash(
-            prev_hash, x[i+m-1], x[i-1], x[i+q_pos-1], x[i+q_pos], pre_comp1, pre_comp2, q)
-        if new_hash == pat_hash:
-            occurence_lst.append(i)     # append to list if hash is equal
-        prev_hash = new_hash            # store the new hash in prev_hash
+    if verify:
+        if isinstance(x, list):
+            p = list(p)                 # a list never equals a memoryview
+        occurence_lst = [i for i in occurence_lst if x[i:i + m] == p]
+    return occurence_lst
 
-    return occurence_lst                # return list of indexes
+
+# Return the list of occurence lists of every pattern in x
+def modMultiPatternMatch(q, patterns, x, alphabet=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | q : prime number                                                        |
+    # | patterns : list of patterns (str or bytes)                              |
+    # | x : document (str or bytes)                                             |
+    # | alphabet : Alphabet from makeAlphabet, None for A-Z as identifier()     |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : occurence_lsts[j] is modPatternMatch(q, patterns[j], x,          |
+    # |        alphabet)                                                        |
+    # |                                                                         |
+    # | The patterns are grouped by length. For every distinct length m one     |
+    # | rolling hash is run over x and each window hash is looked up in a dict  |
+    # | from the hashes of the patterns of length m to the patterns             |
+    # |                                                                         |
+    # | Time Complexity  : O(L * n + total length of patterns + k), L distinct  |
+    # |                    lengths and k reported indexes                       |
+    # | Space Complexity : O(n + number of patterns + k)                        |
+    # ---------------------------------------------------------------------------
+    if alphabet is None:
+        x = codes(x)
+        base, low = 26, 65              # digit of c is c - low
+    else:
+        x = digits(alphabet, x)
+        base, low = alphabet.base, 0
+    n = len(x)
+    occurence_lsts = [[] for _ in patterns]
+
+    # group the patterns by length: m -> {hash -> [indexes of patterns]}
+    by_length = {}
+    for j, p in enumerate(patterns):
+        p = codes(p) if alphabet is None else digits(alphabet, p)
+        pat_hash = 0
+        for c in p:
+            pat_hash = (pat_hash * base + c - low) % q
+        by_length.setdefault(len(p), {}).setdefault(pat_hash, []).append(j)
+
+    for m, pat_hashes in by_length.items():
+        if m > n:
+            continue
+        if m == 0:                      # empty pattern matches everywhere
+            for j in pat_hashes[0]:
+                occurence_lsts[j] = list(range(n + 1))
+            continue
+
+        prev_hash = 0
+        for i in range(m):
+            prev_hash = (prev_hash * base + x[i] - low) % q
+
+        shift = pow(base, m, q)         # base^m % q
+        size = 256 if not isinstance(x, list) else max(max(x), 255) + 1    # codes above 255 in a str
+        out = [((c - low) * shift + low) % q for c in range(size)]
+
+        matches = []                    # (index, hash) of windows whose hash is a pattern hash
+        if prev_hash in pat_hashes:
+            matches.append((0, prev_hash))
+        i = 0
+        for old, new in zip(x, x[m:]):
+            i += 1
+            prev_hash = (prev_hash * base + new - out[old]) % q
+            if prev_hash in pat_hashes:
+                matches.append((i, prev_hash))
+
+        for i, h in matches:            # distribute the matches to the patterns
+            for j in pat_hashes[h]:
+                occurence_lsts[j].append(i)
+
+    return occurence_lsts
+
+
+# Yield the starting indices where p matches a document given in chunks
+def streamPatternMatch(q, p, source, chunk_size=1 << 20, alphabet=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | q : prime number                                                        |
+    # | p : pattern (str or bytes)                                              |
+    # | source : iterable of chunks (str or bytes) of the document, or a file   |
+    # |          object which is read chunk_size characters at a time           |
+    # | chunk_size : characters read at a time from a file object               |
+    # | alphabet : Alphabet from makeAlphabet, None for A-Z as identifier()     |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | generator of the indices in the whole document, same as modPatternMatch |
+    # | on the concatenation of the chunks (with the same alphabet)             |
+    # |                                                                         |
+    # | The rolling hash and the last m characters are carried from one chunk   |
+    # | to the next, so the windows across chunk boundaries are not missed      |
+    # |                                                                         |
+    # | Time Complexity  : O(n + m)                                             |
+    # | Space Complexity : O(m + chunk size)                                    |
+    # ---------------------------------------------------------------------------
+    if hasattr(source, 'read'):
+        f = source
+        source = iter(lambda: f.read(chunk_size), f.read(0))
+
+    if alphabet is None:
+        p = codes(p)
+        base, low = 26, 65              # digit of c is c - low
+    else:
+        p = digits(alphabet, p)
+        base, low = alphabet.base, 0
+    m = len(p)
+    pat_hash = 0
+    for c in p:
+        pat_hash = (pat_hash * base + c - low) % q
+    shift = pow(base, m, q)             # base^m % q
+    out = [((c - low) * shift + low) % q for c in range(256)]
+
+    prev_hash = 0
+    seen = 0                            # number of characters read so far
+    tail = b''                          # last m characters read so far
+    if m == 0:
+        yield 0
+
+    for chunk in source:
+        chunk = codes(chunk) if alphabet is None else digits(alphabet, chunk)
+        if isinstance(chunk, list) or isinstance(tail, list):
+            buf = list(tail) + list(chunk)
+            top = max(buf, default=0)
+            if top >= len(out):         # grow the table for codes above 255 in str chunks
+                out += [((c - low) * shift + low) % q for c in range(len(out), top + 1)]
+        else:
+            buf = tail + bytes(chunk)
+
+        # characters before j in buf have been hashed, start with the first window
+        j = len(tail)
+        while seen < m and j < len(buf):
+            prev_hash = (prev_hash * base + buf[j] - low) % q
+            seen += 1
+            j += 1
+            if seen == m and prev_hash == pat_hash:
+                yield 0
+
+        # roll the hash, old and new are the characters leaving and entering the window
+        for old, new in zip(buf[j - m:], buf[j:]):
+            seen += 1
+            prev_hash = (prev_hash * base + new - out[old]) % q
+            if prev_hash == pat_hash:
+                yield seen - m
+
+        tail = buf[max(0, len(buf) - m):]
+
+
+# Return sorted list of starting indices where p matches the file at path
+def filePatternMatch(q, p, path, alphabet=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | q : prime number                                                        |
+    # | p : pattern (str or bytes)                                              |
+    # | path : path of the document on disk                                     |
+    # | alphabet : Alphabet from makeAlphabet, None for A-Z                     |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : same as modPatternMatch on the bytes of the file                 |
+    # |                                                                         |
+    # | The file is mmap-ed and hashed in place, so it is paged in by the OS    |
+    # | instead of being read into memory                                       |
+    # |                                                                         |
+    # | Time Complexity  : O(n + m)                                             |
+    # | Space Complexity : O(k) for k indexes                                   |
+    # ---------------------------------------------------------------------------
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:           # empty files can not be mmap-ed
+            return modPatternMatch(q, p, b'', alphabet)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                return modPatternMatch(q, p, view, alphabet)
+            finally:
+                view.release()
+
+
+# Return sorted list of starting indices where p matches x, using a process pool
+def parallelPatternMatch(q, p, x, processes=None, alphabet=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | q : prime number                                                        |
+    # | p : pattern (str or bytes)                                              |
+    # | x : document (str or bytes)                                             |
+    # | processes : number of worker processes (default: number of cpus)        |
+    # | alphabet : Alphabet from makeAlphabet, None for A-Z                     |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : same as modPatternMatch(q, p, x, alphabet)                       |
+    # |                                                                         |
+    # | x is copied once into shared memory and split into one shard per        |
+    # | worker, see _shard_tasks                                                |
+    # |                                                                         |
+    # | Time Complexity  : O((n + m) / processes + processes * m)               |
+    # | Space Complexity : O(n + k) for k indexes                               |
+    # ---------------------------------------------------------------------------
+    data = codes(x)
+    processes = processes or os.cpu_count() or 1
+    if isinstance(data, list) or processes == 1 or len(data) < 2 * processes * max(len(p), 1):
+        return modPatternMatch(q, p, x, alphabet)   # not worth (or not possible) to share
+
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        shm.buf[:len(data)] = data
+        tasks = _shard_tasks(('shm', shm.name), len(data), q, p, alphabet, processes)
+        with multiprocessing.Pool(processes) as pool:
+            shards = pool.map(_match_shard, tasks)
+    finally:
+        shm.close()
+        shm.unlink()
+    return [i for shard in shards for i in shard]
+
+
+# Return sorted list of starting indices where p matches the file at path, using a process pool
+def parallelFilePatternMatch(q, p, path, processes=None, alphabet=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | q : prime number                                                        |
+    # | p : pattern (str or bytes)                                              |
+    # | path : path of the document on disk                                     |
+    # | processes : number of worker processes (default: number of cpus)        |
+    # | alphabet : Alphabet from makeAlphabet, None for A-Z                     |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : same as filePatternMatch(q, p, path, alphabet)                   |
+    # |                                                                         |
+    # | Every worker mmaps the file and hashes its own shard of it              |
+    # |                                                                         |
+    # | Time Complexity  : O((n + m) / processes + processes * m)               |
+    # | Space Complexity : O(k) for k indexes                                   |
+    # ---------------------------------------------------------------------------
+    n = os.path.getsize(path)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or n < 2 * processes * max(len(p), 1):
+        return filePatternMatch(q, p, path, alphabet)
+
+    tasks = _shard_tasks(('file', path), n, q, p, alphabet, processes)
+    with multiprocessing.Pool(processes) as pool:
+        shards = pool.map(_match_shard, tasks)
+    return [i for shard in shards for i in shard]
+
+
+# Split the windows of a document of length n into one shard per process
+def _shard_tasks(source, n, q, p, alphabet, processes):
+    # ---------------------------------------------------------------------------
+    # | Shard j reports the windows starting in [start_j, start_{j+1}), so it   |
+    # | reads the characters [start_j, start_{j+1} + m - 1), overlapping the    |
+    # | next shard by m - 1 characters. Every window is checked by exactly one  |
+    # | shard, so the shards need no deduplication and are concatenated in      |
+    # | order                                                                   |
+    # ---------------------------------------------------------------------------
+    m = len(p)
+    windows = n - m + 1
+    starts = [windows * j // processes for j in range(processes + 1)]
+    return [(source, starts[j], starts[j + 1] + m - 1, q, p, alphabet) for j in range(processes)
+            if starts[j] < starts[j + 1]]
+
+
+# Worker of parallelPatternMatch / parallelFilePatternMatch, matches p in one shard
+def _match_shard(task):
+    (kind, name), start, end, q, p, alphabet = task
+    if kind == 'shm':
+        shm = shared_memory.SharedMemory(name=name)
+        view = shm.buf[start:end]
+        try:
+            return [start + i for i in modPatternMatch(q, p, view, alphabet)]
+        finally:
+            view.release()
+            shm.close()
+
+    with open(name, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)[start:end]
+            try:
+                return [start + i for i in modPatternMatch(q, p, view, alphabet)]
+            finally:
+                view.release()
+
+
+# Return the characters of s as a sequence of ints
+def codes(s):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | s : str, bytes, bytearray or memoryview                                 |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | bytes/memoryview of s (list of code points if s has chars above 255)    |
+    # |                                                                         |
+    # | Time Complexity  : O(len(s))                                            |
+    # | Space Complexity : O(len(s))                                            |
+    # ---------------------------------------------------------------------------
+    if isinstance(s, (bytes, bytearray)):
+        return memoryview(s)
+    if isinstance(s, memoryview):
+        return s.cast('B')
+    try:
+        return memoryview(s.encode('latin-1'))
+    except UnicodeEncodeError:
+        return [ord(c) for c in s]
+
+
+# Alphabet of the hash: base, table from bytes to digits (None for the identity)
+# and the bytes of the alphabet (None for all 256 byte values)
+Alphabet = namedtuple('Alphabet', 'base table chars')
+
+
+# Return the Alphabet of the given characters
+def makeAlphabet(chars=None, base=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | chars : characters of the alphabet (str or bytes, codes below 256),     |
+    # |         None for raw bytes, every byte is its own digit                 |
+    # | base : base of the hash, at least the alphabet size (default: the       |
+    # |        alphabet size). A random base can be given here                  |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | Alphabet : chars[d] has digit d                                         |
+    # |                                                                         |
+    # | Time Complexity  : O(1)                                                 |
+    # | Space Complexity : O(1)                                                 |
+    # ---------------------------------------------------------------------------
+    if chars is None:
+        size, table = 256, None
+    else:
+        chars = codes(chars)
+        if isinstance(chars, list) or len(set(chars)) != len(chars):
+            raise ValueError("Alphabet must be distinct characters below 256")
+        chars = bytes(chars)
+        size = len(chars)
+        table = bytearray(256)
+        for d, c in enumerate(chars):
+            table[c] = d
+        table = bytes(table)
+    if base is None:
+        base = max(size, 2)
+    if base < size:
+        raise ValueError("Base is smaller than the alphabet")
+    return Alphabet(base, table, chars)
+
+
+BYTES = makeAlphabet()                              # raw bytes, base 256
+UPPERCASE = makeAlphabet('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+LOWERCASE = makeAlphabet('abcdefghijklmnopqrstuvwxyz')
+ALPHANUMERIC = makeAlphabet('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')
+
+
+# Return the digits of the characters of s in alphabet
+def digits(alphabet, s):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | alphabet : Alphabet                                                     |
+    # | s : str, bytes, bytearray or memoryview                                 |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | bytes/memoryview of the digits, s itself for BYTES-like alphabets       |
+    # |                                                                         |
+    # | The translation is one bytes.translate() with the lookup table, so no   |
+    # | character goes through ord() or a dict. Characters outside the          |
+    # | alphabet raise ValueError instead of hashing wrong                      |
+    # |                                                                         |
+    # | Time Complexity  : O(len(s))                                            |
+    # | Space Complexity : O(len(s)), O(1) for BYTES-like alphabets             |
+    # ---------------------------------------------------------------------------
+    s = codes(s)
+    if isinstance(s, list):
+        raise ValueError("Characters above 255 can not be hashed, encode the text to bytes")
+    if alphabet.table is None:
+        return s
+    s = bytes(s)
+    if s.translate(None, alphabet.chars):
+        raise ValueError("Character not in alphabet")
+    return s.translate(alphabet.table)
+
+
+# Return sorted list of starting indices where p matches x
+def modPatternMatchWildcard(q, p, x, alphabet=None):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | q : prime number                                                        |
+    # | p : pattern with any number of '?' (any character) and character        |
+    # |     classes such as '[AEIOU]' (one of the characters), see parsePattern |
+    # | x : document (str or bytes)                                             |
+    # | alphabet : Alphabet from makeAlphabet, None for A-Z as identifier()     |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : indices i where the hash of x[i:i+m] over the letter positions   |
+    # |        of p equals the hash of p, and x[i+j] is in the class at every   |
+    # |        class position j                                                 |
+    # |                                                                         |
+    # | Hashing skips the '?' and class positions: with c_j = 26^(m-1-j) % q    |
+    # | for letter positions j and c_j = 0 elsewhere, the hash of the window at |
+    # | i is sum_j identifier(x[i+j]) * c_j % q. With few skipped positions     |
+    # | (ROLL_WILDCARDS, or m^0.585 / 4 for long patterns) the full rolling     |
+    # | hash is corrected by one table lookup per skipped position              |
+    # | (wildcard_hashes). With more, the sums are                              |
+    # | a convolution of x with c, computed block by block by big integer       |
+    # | products (window_sums), whose cost does not depend on their number.     |
+    # | Class positions of the candidates are then checked directly. With an    |
+    # | alphabet the letters, classes and x are translated to digits first      |
+    # |                                                                         |
+    # | Time Complexity  : O(n * min(w, m^0.59) + k * (number of classes)), w   |
+    # |                    skipped positions                                    |
+    # | Space Complexity : O(m + k + block)                                     |
+    # ---------------------------------------------------------------------------
+    tokens = parsePattern(p)
+    if alphabet is None:
+        x = codes(x)
+        base, low = 26, 65              # digit of c is c - low
+    else:
+        x = digits(alphabet, x)
+        base, low = alphabet.base, 0
+        table = alphabet.table or range(256)
+        chars = alphabet.chars or range(256)
+        for j, token in enumerate(tokens):
+            if type(token) == int:
+                if token not in chars:
+                    raise ValueError("Character not in alphabet")
+                tokens[j] = table[token]
+            elif type(token) == frozenset:      # characters outside the alphabet never match
+                tokens[j] = frozenset(table[c] for c in token if c in chars)
+    m = len(tokens)
+    n = len(x)
+    if m > n:
+        return []
+
+    coeffs = [0] * m                    # c_j
+    pat_hash = 0
+    power = 1
+    for j in range(m - 1, -1, -1):
+        if type(tokens[j]) == int:
+            coeffs[j] = power
+            pat_hash = (pat_hash + (tokens[j] - low) * power) % q
+        power = (power * base) % q
+    classes = [(j, tokens[j]) for j in range(m) if type(tokens[j]) == frozenset]
+    skipped = [j for j in range(m) if type(tokens[j]) != int]
+
+    if len(skipped) <= max(ROLL_WILDCARDS, m ** 0.585 / 4):      # cheaper than the convolution
+        hashes = wildcard_hashes(x, m, skipped, q, base, low)
+    else:
+        # window_sums works on the raw codes, sum_j (x - low) * c_j = sum_j x * c_j - low * sum_j c_j
+        offset = low * sum(coeffs)
+        hashes = ((total - offset) % q for total in window_sums(x, coeffs, q))
+
+    occurence_lst = []
+    for i, h in enumerate(hashes):
+        if h == pat_hash:
+            for j, allowed in classes:
+                if x[i + j] not in allowed:
+                    break
+            else:
+                occurence_lst.append(i)
+    return occurence_lst
+
+
+# Skipped positions for which wildcard_hashes is always used, rolling costs about one lookup
+# per skipped position and character against m^0.585 / 4 of them for window_sums
+ROLL_WILDCARDS = 2
+
+
+# Yield the hash of every window of x without the skipped positions
+def wildcard_hashes(x, m, skipped, q, base=26, low=65):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | x : sequence of character codes (bytes-like or list)                    |
+    # | m : length of the windows                                               |
+    # | skipped : positions j left out of the hash                              |
+    # | q : prime number                                                        |
+    # | base, low : base of the hash and the code of digit 0                    |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | generator of sum_j (x[i+j] - low) * base^(m-1-j) % q over j not         |
+    # | skipped, for i = 0 .. n-m                                               |
+    # |                                                                         |
+    # | The full hash is rolled as in modPatternMatch, and corr_j[c] =          |
+    # | (c - low) * base^(m-1-j) % q is subtracted for every skipped position j |
+    # |                                                                         |
+    # | Time Complexity  : O(n * (1 + len(skipped)))                            |
+    # | Space Complexity : O(m + len(skipped) * alphabet)                       |
+    # ---------------------------------------------------------------------------
+    size = 256 if not isinstance(x, list) else max(max(x), 255) + 1    # codes above 255 in a str
+    shift = pow(base, m, q)             # base^m % q
+    out = [((c - low) * shift + low) % q for c in range(size)]
+    corr = [[(c - low) * pow(base, m - 1 - j, q) % q for c in range(size)] for j in skipped]
+
+    full = 0
+    for i in range(m):
+        full = (full * base + x[i] - low) % q
+    h = full
+    for j, table in zip(skipped, corr):
+        h -= table[x[j]]
+    yield h % q
+
+    # window i starts at old + 1, its skipped characters are x[i+j] = x[j+1:][i-1]
+    if len(skipped) == 1:
+        table = corr[0]
+        for old, new, c in zip(x, x[m:], x[skipped[0] + 1:]):
+            full = (full * base + new - out[old]) % q
+            yield (full - table[c]) % q
+    elif len(skipped) == 2:
+        table1, table2 = corr
+        for old, new, c1, c2 in zip(x, x[m:], x[skipped[0] + 1:], x[skipped[1] + 1:]):
+            full = (full * base + new - out[old]) % q
+            yield (full - table1[c1] - table2[c2]) % q
+    else:
+        for old, new, *chars in zip(x, x[m:], *[x[j + 1:] for j in skipped]):
+            full = (full * base + new - out[old]) % q
+            h = full
+            for table, c in zip(corr, chars):
+                h -= table[c]
+            yield h % q
+
+
+# Split a pattern into its positions
+def parsePattern(p):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | p : pattern (str or bytes)                                              |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : one entry per position of the pattern, the character code for    |
+    # |        a letter, None for '?' and a frozenset of the character codes    |
+    # |        for a class '[...]'                                              |
+    # |                                                                         |
+    # | Time Complexity  : O(len(p))                                            |
+    # | Space Complexity : O(len(p))                                            |
+    # ---------------------------------------------------------------------------
+    p = codes(p)
+    tokens = []
+    i = 0
+    while i < len(p):
+        if p[i] == 63:                  # '?'
+            tokens.append(None)
+        elif p[i] == 91:                # '['
+            end = i + 1
+            while end < len(p) and p[end] != 93:
+                end += 1
+            if end == len(p):
+                raise ValueError("Unterminated character class in pattern")
+            tokens.append(frozenset(p[i + 1:end]))
+            i = end
+        else:
+            tokens.append(p[i])
+        i += 1
+    return tokens
+
+
+# Yield sum_j x[i+j] * coeffs[j] for every window i of x
+def window_sums(x, coeffs, q, block=1 << 16):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | x : sequence of character codes (bytes-like or list)                    |
+    # | coeffs : list of m integers in [0, q)                                   |
+    # | q : prime number                                                        |
+    # | block : number of windows per product (at least 4 * m are used)         |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | generator of the n - m + 1 sums sum_j x[i+j] * coeffs[j] (not reduced   |
+    # | mod q)                                                                  |
+    # |                                                                         |
+    # | A block of x and the reversed coeffs are packed into two integers with  |
+    # | one slot of b bytes per element, wide enough that no sum overflows its  |
+    # | slot. The slots m-1 .. of their product are the sums of the windows     |
+    # | starting in the block (Kronecker substitution), so the convolution runs |
+    # | in CPython's multiplication. Blocks overlap by m-1 characters, which    |
+    # | keeps the memory at O(block * b) for any document size                  |
+    # |                                                                         |
+    # | Time Complexity  : O(n * m^0.59)                                        |
+    # | Space Complexity : O((block + m) * b)                                   |
+    # ---------------------------------------------------------------------------
+    n = len(x)
+    m = len(coeffs)
+    if isinstance(x, list):             # codes above 255, sum directly
+        terms = [(j, c) for j, c in enumerate(coeffs) if c]
+        for i in range(n - m + 1):
+            yield sum(x[i + j] * c for j, c in terms)
+        return
+
+    b = 8
+    while (m * 255 * q).bit_length() > 8 * b:
+        b += 8
+    pat = bytearray(m * b)
+    for j in range(m):
+        pat[(m - 1 - j) * b:(m - j) * b] = coeffs[j].to_bytes(b, 'little')
+    pat = int.from_bytes(pat, 'little')
+
+    block = max(block, 4 * m)
+    for start in range(0, n - m + 1, block):
+        chunk = x[start:start + block + m - 1]
+        size = len(chunk)
+        doc = bytearray(size * b)
+        doc[0::b] = chunk               # lowest byte of every slot
+        product = int.from_bytes(doc, 'little') * pat
+        slots = product.to_bytes((size + m) * b, 'little')[(m - 1) * b:size * b]
+
+        if b == 8:
+            sums = array('Q')
+            sums.frombytes(slots)
+            if sys.byteorder == 'big':
+                sums.byteswap()
+            yield from sums
+        else:
+            for k in range(0, len(slots), b):
+                yield int.from_bytes(slots[k:k + b], 'little')
 
 
 def identifier(c):
@@ -281,6 +1105,313 @@ def wildcard_string_rehash(prev_hash, new_char, old_char, old_q_char, new_q_char
     return new_hash
 
 
+class DocumentIndex:
+    """Suffix array index of a document for repeated pattern queries"""
+
+    HEADER = struct.Struct('<4sIQc7x')              # magic, version, n, typecode of the arrays
+    MAGIC = b'A4DI'
+    VERSION = 1
+
+    def __init__(self, x):
+        # -----------------------------------------------------------------------
+        # | INPUT                                                               |
+        # | x : document (str or bytes)                                         |
+        # |                                                                     |
+        # | self.sa  : start indices of the suffixes of x in sorted order       |
+        # | self.lcp : lcp[i] = length of the longest common prefix of the      |
+        # |            suffixes sa[i-1] and sa[i], lcp[0] = 0                   |
+        # |                                                                     |
+        # | Time Complexity  : O(n * log(n)), see suffixArray                   |
+        # | Space Complexity : O(n)                                             |
+        # -----------------------------------------------------------------------
+        text = codes(x)
+        if isinstance(text, list):
+            raise ValueError("Characters above 255 can not be indexed, encode the text to bytes")
+        self.text = bytes(text)
+        typecode = 'I' if len(self.text) < 1 << 32 else 'Q'
+        self.sa = array(typecode, suffixArray(self.text))
+        self.lcp = array(typecode, lcpArray(self.text, self.sa))
+
+    def __len__(self):
+        return len(self.text)
+
+    def _prefixes(self, m):
+        # function giving the first m characters of a suffix as bytes, used as bisect key
+        text = self.text
+        if isinstance(text, memoryview):
+            return lambda i: text[i:i + m].tobytes()
+        return lambda i: text[i:i + m]
+
+    def _range(self, p):
+        # range [lo, hi) of sa of the suffixes starting with p
+        key = self._prefixes(len(p))
+        lo = bisect_left(self.sa, p, key=key)
+        hi = bisect_right(self.sa, p, lo, key=key)
+        return lo, hi
+
+    def find(self, p):
+        # -----------------------------------------------------------------------
+        # | INPUT                                                               |
+        # | p : pattern (str or bytes)                                          |
+        # |                                                                     |
+        # | OUTPUT                                                              |
+        # | list : sorted starting indices of the occurences of p (exact)       |
+        # |                                                                     |
+        # | The suffixes starting with p are consecutive in sa, their range is  |
+        # | found by two binary searches                                        |
+        # |                                                                     |
+        # | Time Complexity  : O(m * log(n) + k * log(k)) for k indexes         |
+        # | Space Complexity : O(m + k)                                         |
+        # -----------------------------------------------------------------------
+        p = codes(p)
+        if len(p) == 0:                 # occurs at 0..n as for modPatternMatch, sa has no empty suffix
+            return list(range(len(self.text) + 1))
+        if isinstance(p, list):         # can not occur in a bytes document
+            return []
+        lo, hi = self._range(bytes(p))
+        return sorted(self.sa[lo:hi])
+
+    def count(self, p):
+        # number of occurences of p, Time Complexity : O(m * log(n))
+        p = codes(p)
+        if len(p) == 0:
+            return len(self.text) + 1
+        if isinstance(p, list):
+            return 0
+        lo, hi = self._range(bytes(p))
+        return hi - lo
+
+    def findWildcard(self, p):
+        # -----------------------------------------------------------------------
+        # | INPUT                                                               |
+        # | p : pattern with '?' and character classes, see parsePattern        |
+        # |                                                                     |
+        # | OUTPUT                                                              |
+        # | list : sorted starting indices where p matches (exact)              |
+        # |                                                                     |
+        # | p is split on the '?' and classes into runs of letters. The longest |
+        # | run is looked up with find and the rest of p is checked at each     |
+        # | occurences. A pattern without letters is checked at every index     |
+        # |                                                                     |
+        # | Time Complexity  : O(r * log(n) + c * m), longest run of length     |
+        # |                    r and its c occurences                           |
+        # | Space Complexity : O(m + c)                                         |
+        # -----------------------------------------------------------------------
+        tokens = parsePattern(p)
+        m = len(tokens)
+        n = len(self.text)
+        if m > n:
+            return []
+
+        # longest run tokens[start:start+length] of letters
+        start, length = 0, 0
+        j = 0
+        while j < m:
+            if type(tokens[j]) == int:
+                end = j
+                while end < m and type(tokens[end]) == int:
+                    end += 1
+                if end - j > length:
+                    start, length = j, end - j
+                j = end
+            else:
+                j += 1
+
+        if length == 0:
+            candidates = range(n - m + 1)
+        else:
+            if max(tokens[start:start + length]) > 255:
+                return []
+            candidates = [i - start for i in self.find(bytes(tokens[start:start + length]))
+                          if start <= i <= n - m + start]
+
+        rest = [(j, t) for j, t in enumerate(tokens) if t is not None and not start <= j < start + length]
+        text = self.text
+        occurence_lst = []
+        for i in candidates:
+            for j, t in rest:
+                c = text[i + j]
+                if c != t if type(t) == int else c not in t:
+                    break
+            else:
+                occurence_lst.append(i)
+        return occurence_lst
+
+    def longestRepeat(self):
+        # -----------------------------------------------------------------------
+        # | OUTPUT                                                              |
+        # | (length, list) : length of the longest substring occuring at least  |
+        # |                  twice and the sorted indices of its occurences     |
+        # |                                                                     |
+        # | Time Complexity  : O(n + k * log(k))                                |
+        # -----------------------------------------------------------------------
+        if len(self.lcp) < 2:
+            return 0, []
+        i = max(range(len(self.lcp)), key=self.lcp.__getitem__)
+        length = self.lcp[i]
+        lo, hi = self._range(self._prefixes(length)(self.sa[i]))
+        return length, sorted(self.sa[lo:hi])
+
+    def save(self, path):
+        # -----------------------------------------------------------------------
+        # | INPUT                                                               |
+        # | path : path of the file                                             |
+        # |                                                                     |
+        # | The file has the header, the text padded to a multiple of 8 bytes   |
+        # | and the sa and lcp arrays, queried directly by DocumentIndex.load   |
+        # |                                                                     |
+        # | Time Complexity  : O(n)                                             |
+        # -----------------------------------------------------------------------
+        n = len(self.text)
+        with open(path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, n, self.sa.typecode.encode()))
+            f.write(self.text)
+            f.write(bytes(-n % 8))
+            f.write(self.sa)
+            f.write(self.lcp)
+
+    @classmethod
+    def load(cls, path):
+        # -----------------------------------------------------------------------
+        # | INPUT                                                               |
+        # | path : path of a file written by save                               |
+        # |                                                                     |
+        # | OUTPUT                                                              |
+        # | DocumentIndex : backed by the read only mmap of the file, loading   |
+        # |                 does not read the file, processes share its pages   |
+        # |                                                                     |
+        # | Time Complexity  : O(1)                                             |
+        # -----------------------------------------------------------------------
+        with open(path, 'rb') as f:
+            buf = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        magic, version, n, typecode = cls.HEADER.unpack_from(buf)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("Not a DocumentIndex file")
+        typecode = typecode.decode()
+        size = n * array(typecode).itemsize
+
+        index = cls.__new__(cls)
+        start = cls.HEADER.size
+        index.text = buf[start:start + n]
+        start += n + (-n % 8)
+        index.sa = buf[start:start + size].cast(typecode)
+        index.lcp = buf[start + size:start + 2 * size].cast(typecode)
+        return index
+
+
+# Return the suffix array of the bytes x
+def suffixArray(x):
+    # ---------------------------------------------------------------------------
+    # | INPUT                                                                   |
+    # | x : bytes                                                               |
+    # |                                                                         |
+    # | OUTPUT                                                                  |
+    # | list : start indices of the suffixes of x in sorted order               |
+    # |                                                                         |
+    # | The suffixes are first sorted by their first 7 bytes, read for all of   |
+    # | them at once as big-endian words with array('Q'). A group is a run of   |
+    # | sa whose suffixes share their first h bytes, and rank[i] is the index   |
+    # | in sa where the group of i starts. Every round sorts only the groups of |
+    # | more than one suffix, by rank[i+h], which splits them into groups with  |
+    # | the same first 2h bytes (prefix doubling as in Larsson-Sadakane).       |
+    # | Suffixes in place are not visited again, so with short repeats the      |
+    # | rounds after the first cost little. rank is an array of n + h ints      |
+    # |                                                                         |
+    # | Time Complexity  : O(n * log(n)), O(n * log(n)^2) for long repeats      |
+    # | Space Complexity : O(n)                                                 |
+    # ---------------------------------------------------------------------------
+    n = len(x)
+    if n == 0:
+        return []
+
+    # key[i] = first 7 bytes of suffix i (zero padded) * 8 + its length up to 7, so a
+    # suffix sorts before the longer ones it is a prefix of
+    h = 7
+    padded = bytes(x) + bytes(8)
+    key = [0] * n
+    for r in range(8):
+        words = array('Q')
+        words.frombytes(padded[r:r + 8 * ((n - r + 7) // 8)])
+        if sys.byteorder == 'little':
+            words.byteswap()
+        key[r::8] = [(w >> 8) << 3 | h for w in words]
+    for i in range(max(0, n - h), n):
+        key[i] = (key[i] >> 3) << 3 | (n - i)
+
+    sa = sorted(range(n), key=key.__getitem__)
+    rank = array('q', [0]) * n
+    deque(map(rank.__setitem__, sa, range(n)), 0)      # rank[sa[j]] = j
+
+    # the runs of equal keys in sorted order, from the j with key[j] == key[j-1]
+    key = list(map(key.__getitem__, sa))
+    ties = compress(count(1), map(operator.eq, key, islice(key, 1, None)))
+    groups = []                         # [lo, hi) of the groups of more than one suffix
+    lo = hi = 0
+    for j in ties:
+        if j > hi:                      # j - 1 starts a new group
+            if hi - lo > 1:
+                groups.append((lo, hi))
+            lo = j - 1
+        hi = j + 1
+    if hi - lo > 1:
+        groups.append((lo, hi))
+    del key
+    for lo, hi in groups:
+        for i in sa[lo:hi]:
+            rank[i] = lo
+
+    while groups:
+        rank += array('q', [-1]) * (n + h - len(rank))     # rank[i + h] = -1 past the end
+        refined = []
+        for lo, hi in groups:
+            # rank[i + h] of a group split earlier in this round is already finer, which
+            # still orders the suffixes correctly
+            members = sa[lo:hi]
+            key = [rank[i + h] for i in members]
+            order = sorted(range(hi - lo), key=key.__getitem__)
+            sa[lo:hi] = map(members.__getitem__, order)
+            key = list(map(key.__getitem__, order))
+            starts = [lo, *compress(count(lo + 1), map(operator.ne, key, islice(key, 1, None))), hi]
+            for start, end in zip(starts, islice(starts, 1, None)):
+                for i in sa[start:end]:
+                    rank[i] = start
+                if end - start > 1:
+                    refined.append((start, end))
+        groups = refined
+        h *= 2
+    return sa
+
+
+# Return the lcp array of the suffix array sa of x (Kasai's algorithm)
+def lcpArray(x, sa):
+    # ---------------------------------------------------------------------------
+    # | lcp[i] is the length of the longest common prefix of the suffixes       |
+    # | sa[i-1] and sa[i]. The suffixes are visited in text order, where the    |
+    # | lcp drops by at most one from one suffix to the next                    |
+    # |                                                                         |
+    # | Time Complexity  : O(n)                                                 |
+    # | Space Complexity : O(n)                                                 |
+    # ---------------------------------------------------------------------------
+    n = len(x)
+    rank = [0] * n
+    for r, i in enumerate(sa):
+        rank[i] = r
+    lcp = [0] * n
+    h = 0
+    for i in range(n):
+        if rank[i] > 0:
+            j = sa[rank[i] - 1]
+            while i + h < n and j + h < n and x[i + h] == x[j + h]:
+                h += 1
+            lcp[rank[i]] = h
+            if h > 0:
+                h -= 1
+        else:
+            h = 0
+    return lcp
+
+
 # if __name__ == "__main__":
 
 #     q = 101
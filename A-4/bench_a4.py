@@ -0,0 +1,217 @@
+"""Benchmarks for the randomized pattern matchers (a4.py)
+
+Times randPrime, findN, hash and rehash, the full matchers over a range of
+document sizes and pattern lengths, and estimates the empirical false positive
+rate of modPatternMatch and modPatternMatchWildcard with random primes against
+the eps it was chosen for.
+Everything is printed as JSON, e.g.
+
+    python bench_a4.py --sizes 10000 100000 1000000 > before.json
+
+so that two commits can be compared. Documents larger than --memory-limit are
+written to a temporary file and matched with filePatternMatch, which makes the
+largest sizes (up to 10^9) possible without holding them in memory.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import a4
+
+
+LETTERS = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+EPS = [1e-1, 1e-3, 1e-6, 1e-9]
+
+
+# ------------------------------ Helpers --------------------------------------
+
+
+def random_text(n, rnd, letters=LETTERS):
+    return bytes(rnd.choice(letters) for _ in range(n))
+
+
+def timed(f, *args, repeat=1):
+    """Return (result of the last call, seconds per call)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = f(*args)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def write_text(f, n, rnd, block=1 << 20):
+    # repeats one random block, which is enough for timing
+    data = random_text(min(n, block), rnd)
+    left = n
+    while left > 0:
+        f.write(data[:left])
+        left -= len(data)
+    f.flush()
+
+
+# ----------------------------- Benchmarks ------------------------------------
+
+
+def bench_primes(args, rnd):
+    results = []
+    for eps in EPS:
+        for m in args.lengths:
+            N, findN_s = timed(a4.findN, eps, m, repeat=1000)
+            _, randPrime_s = timed(a4.randPrime, N, repeat=args.primes)
+            results.append({'eps': eps, 'm': m, 'N': N, 'findN_us': findN_s * 1e6,
+                            'randPrime_us': randPrime_s * 1e6})
+    return results
+
+
+def bench_hash(args, rnd):
+    # the original per character functions, for comparison with the matchers
+    results = []
+    q = a4.randPrime(a4.findN(1e-6, 100))
+    for m in args.lengths:
+        s = random_text(m + 1000, rnd).decode()
+        (h, pre_comp), hash_s = timed(a4.hash, s, 0, m, q, repeat=100)
+        start = time.perf_counter()
+        for i in range(1, 1001):
+            h = a4.rehash(s[i + m - 1], s[i - 1], q, h, pre_comp)
+        rehash_s = (time.perf_counter() - start) / 1000
+        results.append({'m': m, 'hash_us': hash_s * 1e6, 'rehash_us': rehash_s * 1e6})
+    return results
+
+
+def bench_matchers(n, args, rnd):
+    results = []
+    if n > args.memory_limit:
+        with tempfile.NamedTemporaryFile() as f:
+            write_text(f, n, rnd)
+            for m in args.lengths:
+                q = a4.randPrime(a4.findN(args.eps, m))
+                p = random_text(m, rnd)
+                _, seconds = timed(a4.filePatternMatch, q, p, f.name)
+                results.append({'n': n, 'm': m, 'matcher': 'filePatternMatch', 's': seconds,
+                                'chars_per_s': n / seconds})
+        return results
+
+    x = random_text(n, rnd)
+    for m in args.lengths:
+        p = x[n // 2:n // 2 + m]                        # at least one true match
+        pw = p[:m // 2] + b'?' + p[m // 2 + 1:]
+        q = a4.randPrime(a4.findN(args.eps, m))
+        matchers = [
+            ('modPatternMatch', lambda: a4.modPatternMatch(q, p, x)),
+            ('randPatternMatch', lambda: a4.randPatternMatch(args.eps, p, x)),
+            ('randPatternMatchWildcard', lambda: a4.randPatternMatchWildcard(args.eps, pw, x)),
+            ('randMersennePatternMatch', lambda: a4.randMersennePatternMatch(p, x)),
+            ('randMersennePatternMatch_2', lambda: a4.randMersennePatternMatch(p, x, 2)),
+        ]
+        for name, f in matchers:
+            _, seconds = timed(f)
+            results.append({'n': n, 'm': m, 'matcher': name, 's': seconds, 'chars_per_s': n / seconds})
+    return results
+
+
+def bench_parallel(n, args, rnd):
+    x = random_text(n, rnd)
+    p = x[:args.lengths[0]]
+    q = a4.randPrime(a4.findN(args.eps, len(p)))
+    results = []
+    for processes in args.processes:
+        _, seconds = timed(a4.parallelPatternMatch, q, p, x, processes)
+        results.append({'n': n, 'processes': processes, 's': seconds, 'chars_per_s': n / seconds})
+    return results
+
+
+def bench_index(n, args, rnd):
+    x = random_text(n, rnd)
+    index, build_s = timed(a4.DocumentIndex, x)
+    results = {'n': n, 'build_s': build_s, 'queries': []}
+    for m in args.lengths:
+        p = x[n // 2:n // 2 + m]
+        _, find_s = timed(index.find, p, repeat=100)
+        results['queries'].append({'m': m, 'find_us': find_s * 1e6})
+    return results
+
+
+def bench_false_positives(args, rnd):
+    """Empirical rate of falsely reported windows over many random primes, for modPatternMatch
+    and for modPatternMatchWildcard with few '?' (rolling hash) and many '?' (window_sums)"""
+    results = []
+    x = random_text(args.fp_size, rnd, b'AB')
+    for m in args.lengths:
+        windows = len(x) - m + 1
+        few = b'C' * (m // 2) + b'?' + b'C' * (m - m // 2 - 1)
+        many = bytes(b'C'[0] if j % 4 == 0 else b'?'[0] for j in range(m))
+        patterns = [(a4.modPatternMatch, b'C' * m), (a4.modPatternMatchWildcard, few),
+                    (a4.modPatternMatchWildcard, many)]                   # the letters never occur in x
+
+        # cost of verifying a reported window directly
+        start = time.perf_counter()
+        for i in range(1000):
+            x[i:i + m] == b'C' * m
+        verify_s = (time.perf_counter() - start) / 1000
+
+        for matcher, p in patterns:
+            wildcards = p.count(b'?')
+            if matcher is a4.modPatternMatch:
+                path = 'rolling'
+            else:                                       # the choice made by modPatternMatchWildcard
+                path = 'rolling' if wildcards <= max(a4.ROLL_WILDCARDS, m ** 0.585 / 4) else 'window_sums'
+            for eps in EPS[:2]:
+                N = a4.findN(eps, m)
+                false_positives = 0
+                seconds = 0
+                for _ in range(args.fp_trials):
+                    q = a4.randPrime(N)
+                    found, s = timed(matcher, q, p, x)
+                    seconds += s
+                    false_positives += len(found)
+                rate = false_positives / (windows * args.fp_trials)
+                results.append({'matcher': matcher.__name__, 'm': m, 'wildcards': wildcards, 'path': path,
+                                'eps': eps, 'N': N, 'trials': args.fp_trials, 'windows': windows,
+                                'false_positives': false_positives, 'rate': rate, 'within_eps': rate <= eps,
+                                'match_s': seconds / args.fp_trials, 'verify_us': verify_s * 1e6})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10**4, 10**5, 10**6],
+                        help='document sizes (up to 10^9, which takes a long time)')
+    parser.add_argument('--lengths', type=int, nargs='+', default=[4, 16, 64], help='pattern lengths')
+    parser.add_argument('--eps', type=float, default=1e-6, help='eps of the timed matchers')
+    parser.add_argument('--primes', type=int, default=100, help='randPrime calls per timing')
+    cpus = os.cpu_count() or 1
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=[1 << i for i in range(cpus.bit_length())] + ([cpus] if cpus & (cpus - 1) else []),
+                        help='process counts of parallelPatternMatch (default: the powers of two below the cpu count, then the cpu count)')
+    parser.add_argument('--memory-limit', type=int, default=10**8,
+                        help='larger documents are matched from a file')
+    parser.add_argument('--index-limit', type=int, default=10**6, help='largest n indexed by DocumentIndex')
+    parser.add_argument('--fp-size', type=int, default=2000, help='document size of the false positive test')
+    parser.add_argument('--fp-trials', type=int, default=200, help='random primes per false positive test')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    random.seed(args.seed)                              # used by randPrime
+    report = {'python': sys.version.split()[0], 'seed': args.seed, 'cpus': os.cpu_count(),
+              'primes': bench_primes(args, rnd), 'hash': bench_hash(args, rnd),
+              'matchers': [], 'parallel': [], 'index': [],
+              'false_positives': bench_false_positives(args, rnd)}
+    for n in args.sizes:
+        report['matchers'].extend(bench_matchers(n, args, rnd))
+        if n <= args.memory_limit:
+            report['parallel'].extend(bench_parallel(n, args, rnd))
+        if n <= args.index_limit:
+            report['index'].append(bench_index(n, args, rnd))
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,6 @@
+import multiprocessing
+from array import array
+from multiprocessing import shared_memory
 
 INF = float('inf')                                          # infinity
 
@@ -188,6 +191,138 @@ class MaxHeap:
         return f'Heap is {self._elem}\nLocator: {self._locator}'
 
 
+class IndexedMaxHeap:
+    """Max Heap of the node ids 0..n-1 keyed by capacity, stored in flat arrays"""
+    # -------------------------- NON PUBLIC METHODS -------------------------------
+
+    def _bubble_up(self, m):
+        # move the id at position m up to its correct position
+        # the id is held aside and the smaller parents are moved down into the hole
+        # TIME COMPLEXITY : O(logn)
+
+        heap, pos, cap = self._heap, self._pos, self._cap
+        key = heap[m]
+        key_cap = cap[key]
+        while m > 0:
+            par = (m-1)//2                                  # parent index
+            if key_cap > cap[heap[par]]:                    # if child is greater than parent
+                heap[m] = heap[par]                         # move parent down
+                pos[heap[m]] = m
+                m = par
+            else:
+                break
+        heap[m] = key                                       # put the id in the hole
+        pos[key] = m
+
+    def _bubble_down(self, m):
+        # move the id at position m down to its correct position
+        # TIME COMPLEXITY : O(logn)
+
+        heap, pos, cap = self._heap, self._pos, self._cap
+        size = len(heap)
+        key = heap[m]
+        key_cap = cap[key]
+        while 2*m+1 < size:                                 # while node has left child
+            max_child = 2*m+1
+            right = max_child+1
+            if right < size and cap[heap[right]] > cap[heap[max_child]]:
+                max_child = right                           # right child is greater than left child
+
+            if key_cap < cap[heap[max_child]]:              # if parent is less than max_child
+                heap[m] = heap[max_child]                   # move max_child up
+                pos[heap[m]] = m
+                m = max_child
+            else:
+                break
+        heap[m] = key                                       # put the id in the hole
+        pos[key] = m
+
+    # ----------------------- PUBLIC METHODS -------------------------------
+
+    def __init__(self, n):
+        """Constructor for IndexedMaxHeap class"""
+        # n is the number of ids
+        # TIME COMPLEXITY : O(n)
+        self._cap = [-INF] * n                              # capacity of every id
+        self._heap = []                                     # ids in heap order
+        self._pos = [-1] * n                                # position of every id in _heap, -1 if absent
+
+    def is_empty(self):
+        """returns True if heap is empty else False"""
+        # TIME COMPLEXITY : O(1)
+        return len(self._heap) == 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, key):
+        return self._pos[key] >= 0
+
+    def capacity(self, key):
+        """returns the last capacity of key (-INF if it was never added)"""
+        # TIME COMPLEXITY : O(1)
+        return self._cap[key]
+
+    def max(self):
+        """returns (id, capacity) of the maximum without removing it"""
+        # TIME COMPLEXITY : O(1)
+
+        if self.is_empty():                                 # if heap is empty
+            raise ValueError("Heap is Empty")               # raise error
+        key = self._heap[0]
+        return key, self._cap[key]
+
+    def remove_max(self):
+        """Remove and return (id, capacity) of the maximum from the heap"""
+        # TIME COMPLEXITY : O(logn)
+
+        heap = self._heap
+        if not heap:                                        # if heap is empty
+            raise ValueError("Heap is Empty")               # raise error
+
+        key = heap[0]
+        last = heap.pop()                                   # remove the last id
+        self._pos[key] = -1
+        if heap:
+            heap[0] = last                                  # move it to the root
+            self._bubble_down(0)                            # move the root down
+        return key, self._cap[key]
+
+    def increase_key(self, key, cap):
+        """set the capacity of key to cap if key is not in the heap or cap is
+        greater than its capacity, and return True if it was set else False"""
+        # TIME COMPLEXITY : O(logn)
+
+        pos = self._pos[key]
+        if pos < 0:                                         # if key is not present in heap
+            self._cap[key] = cap
+            self._heap.append(key)
+            self._bubble_up(len(self._heap)-1)              # move the id up
+            return True
+
+        if cap > self._cap[key]:                            # if new capacity is greater than previous capacity
+            self._cap[key] = cap
+            self._bubble_up(pos)                            # move the id up
+            return True
+
+        return False
+
+    def __str__(self):
+        return f'Heap is {[(key, self._cap[key]) for key in self._heap]}'
+
+
+def _capacity_array(caps):
+    # flat array of the capacities, a list if they do not fit in one
+    try:
+        return array('q', caps)                         # integer capacities
+    except TypeError:
+        if all(type(cap) == float for cap in caps):
+            return array('d', caps)                     # float capacities
+        return list(caps)                               # mixed, keep the values as given
+    except OverflowError:
+        return list(caps)
+
+
 class Graph:
     """Graph representation using adjacency list"""
 
@@ -196,7 +331,84 @@ class Graph:
         # TIME COMPLEXITY : O(1)
         self.n = n                                      # number of nodes
         self.edges = {}                                 # dictionary for storing edges
-
+        self._csr = None                                # (offsets, neighbours, capacities), see csr
+
+    @classmethod
+    def fromLinks(cls, n, links):
+        """Build the graph of the undirected links directly in the CSR layout"""
+        # links is the list of tuples (start, end, capacity)
+        # parallel links keep the maximum capacity and self loops are dropped as in addEdge,
+        # and the neighbours of every node are in the order addEdge would add them
+        # TIME COMPLEXITY : O(n+m)
+
+        offsets = [0] * (n+1)                           # offsets[u+1] = degree of u, then prefix sums
+        for link in links:
+            if link[0] != link[1]:
+                offsets[link[0]+1] += 1
+                offsets[link[1]+1] += 1
+        for u in range(n):
+            offsets[u+1] += offsets[u]
+
+        # place both directions of every link, in the order of links
+        neighbours = [0] * offsets[n]
+        capacities = [0] * offsets[n]
+        pos = offsets[:n]                               # next free slot of every node
+        for start, end, capacity in links:
+            if start != end:
+                neighbours[pos[start]] = end
+                capacities[pos[start]] = capacity
+                pos[start] += 1
+                neighbours[pos[end]] = start
+                capacities[pos[end]] = capacity
+                pos[end] += 1
+
+        # merge parallel edges in place, keeping the first position and the maximum capacity
+        k = 0
+        lo = 0
+        for u in range(n):
+            hi = offsets[u+1]
+            seen = {}                                   # neighbour -> its slot, for this node only
+            for j in range(lo, hi):
+                i = seen.get(neighbours[j])
+                if i is None:
+                    seen[neighbours[j]] = k
+                    neighbours[k] = neighbours[j]
+                    capacities[k] = capacities[j]
+                    k += 1
+                elif capacities[j] > capacities[i]:
+                    capacities[i] = capacities[j]
+            lo = hi
+            offsets[u+1] = k
+
+        graph = cls(n)
+        graph.edges = None                              # built from the CSR arrays if needed
+        graph._csr = (array('q', offsets), array('i' if n < 1 << 31 else 'q', neighbours[:k]),
+                      _capacity_array(capacities[:k]))
+        return graph
+
+    def csr(self):
+        """returns (offsets, neighbours, capacities): the edges of node u go to
+        neighbours[offsets[u]:offsets[u+1]] with the same slice of capacities"""
+        # TIME COMPLEXITY : O(n+m) the first time after a change, then O(1)
+
+        if self._csr is None:
+            offsets = array('q', [0])
+            neighbours = []
+            capacities = []
+            for u in range(self.n):
+                for conn, capacity in self.edges.get(u, {}).items():
+                    neighbours.append(conn)
+                    capacities.append(capacity)
+                offsets.append(len(neighbours))
+            self._csr = (offsets, array('i' if self.n < 1 << 31 else 'q', neighbours),
+                         _capacity_array(capacities))
+        return self._csr
+
+    def _edges_from_csr(self):
+        # dictionary of dictionaries of the edges in the CSR arrays
+        offsets, neighbours, capacities = self._csr
+        return {u: dict(zip(neighbours[offsets[u]:offsets[u+1]], capacities[offsets[u]:offsets[u+1]]))
+                for u in range(self.n) if offsets[u] < offsets[u+1]}
     
     def addEdge(self, start, end, capacity):       
         """Add edge from start to end with given capacity"""
@@ -204,6 +416,10 @@ class Graph:
         # capacity is the capacity of edge
         # TIME COMPLEXITY : O(1)
         
+        if self.edges is None:                          # graph built by fromLinks
+            self.edges = self._edges_from_csr()
+        self._csr = None                                # the CSR arrays are rebuilt by csr
+
         if start == end:                                # if start and end are same then don't add edge
             return
 
@@ -225,60 +441,343 @@ class Graph:
 
         # Hence TIME COMPLEXITY : O(mlogm)
 
+        capacity, prev_path = self._widest_paths(start, [end])
+        if capacity[end] is None:                       # heap ran empty before reaching end
+            raise ValueError("Heap is Empty")
+
+        # found the max cap path as the end node is explored
+        FINAL_CAPACITY = capacity[end]                  # get maximum capacity of path
+        return FINAL_CAPACITY, _trace_path(prev_path, end)  # return maximum capacity and path
+
+    def widest_path_tree(self, start):
+        """maximum capacity from start to every node and the tree of the maximum capacity paths"""
+        # start is an integer denoting the id of a node
+        # returns (capacity, prev_path) where capacity[u] is the maximum capacity from start to u
+        # (None if u is not reachable) and prev_path[u] the previous node on its path
+        # one run replaces n-1 calls of dijkstra, the paths are built on demand by tree_path
+        # TIME COMPLEXITY : O(mlogn)
+        return self._widest_paths(start)
+
+    @staticmethod
+    def tree_path(tree, end):
+        """list of nodes of the maximum capacity path to end in a tree from widest_path_tree"""
+        # TIME COMPLEXITY : O(length of the path)
+        capacity, prev_path = tree
+        if capacity[end] is None:                       # end is not reachable from start
+            raise ValueError("No path to end")
+        return _trace_path(prev_path, end)
+
+    def _widest_paths(self, start, targets=None):
+        # run Dijkstra's algorithm from start until every node of targets is explored
+        # (every reachable node if targets is None) and return the arrays
+        # capacity : maximum capacity from start of every explored node, None for the others
+        # prev_path: previous node in the maximum capacity path of every explored node
+        # TIME COMPLEXITY : O(mlogn)
+
         is_explored = [False] * self.n                  # array to check if node is explored or not
         prev_path = [None] * self.n                     # array to store previous node in maximum capacity path
-        
-        heap = MaxHeap([HeapNode(start, INF)])          # create heap with start node and capacity INF
+        capacity = [None] * self.n                      # array to store capacity of explored nodes
+
+        if targets is None:
+            remaining = self.n                          # number of targets not explored yet
+            is_target = None
+        else:
+            is_target = [False] * self.n
+            for t in targets:
+                is_target[t] = True
+            remaining = sum(is_target)
+
+        offsets, neighbours, capacities = self.csr()   # edges of u are the slices offsets[u]:offsets[u+1]
+        heap = IndexedMaxHeap(self.n)                   # heap of node ids, no HeapNode per relaxation
+        heap.increase_key(start, INF)                   # start node with capacity INF
 
-        while heap.max().get_key() != end:              # loop until end node is not explored
-            cur_node = heap.remove_max()                # remove node with maximum capacity from heap
-            cur_router = cur_node.get_key()
+        while remaining and not heap.is_empty():        # loop until all targets are explored
+            cur_router, cur_cap = heap.remove_max()     # remove node with maximum capacity from heap
             is_explored[cur_router] = True              # mark current node as explored
+            capacity[cur_router] = cur_cap
+            if is_target is None or is_target[cur_router]:
+                remaining -= 1
 
-            for conn in self.edges[cur_router].keys():  # loop over all connections of current node
+            lo, hi = offsets[cur_router], offsets[cur_router+1]
+            for conn, cap in zip(neighbours[lo:hi], capacities[lo:hi]):   # loop over all connections of current node
                 if not is_explored[conn]:               # if connection is not explored
-                    if heap.update_capacity(HeapNode(conn, min(cur_node.get_capacity(), self.edges[cur_router][conn]))):    # update capacity of connection if it is greater than current capacity
+                    if heap.increase_key(conn, min(cur_cap, cap)):    # update capacity of connection if it is greater than current capacity
                         prev_path[conn] = cur_router    # update previous node in maximum capacity path
-        
-        # found the max cap path as the end node is on top of heap
-        end_node = heap.max()                           # get end node from heap
-        FINAL_CAPACITY = end_node.get_capacity()        # get maximum capacity of path
-        path = []                                       # array to store nodes in maximum capacity path
-        cur = end                                       # start from end node
-        while cur is not None:                          # loop until start node is not reached        
-            path.append(cur)                            # add current node in path
-            cur = prev_path[cur]                        # move to previous node in path
 
-        return FINAL_CAPACITY, path[::-1]               # return maximum capacity and path in reverse order
+        return capacity, prev_path
 
     def __str__(self) -> str:
         s = ''
-        for key in self.edges.keys():
-            s += f'{key}: {self.edges[key]}\n'
+        edges = self.edges if self.edges is not None else self._edges_from_csr()
+        for key in edges.keys():
+            s += f'{key}: {edges[key]}\n'
 
         return s
 
 
-def findMaxCapacity(n, links, s, t):
+def _trace_path(prev_path, end):
+    # list of nodes of the path ending at end, following prev_path back to the start
+    # TIME COMPLEXITY : O(length of the path)
+    path = []                                           # array to store nodes in maximum capacity path
+    cur = end                                           # start from end node
+    while cur is not None:                              # loop until start node is not reached
+        path.append(cur)                                # add current node in path
+        cur = prev_path[cur]                            # move to previous node in path
+    return path[::-1]                                   # path in reverse order
+
+
+class UnionFind:
+    """Disjoint sets of the nodes 0..n-1 with path compression and union by size"""
+
+    def __init__(self, n):
+        # TIME COMPLEXITY : O(n)
+        self._parent = list(range(n))                   # parent of every node, roots are their own parent
+        self._size = [1] * n                            # size of the set of every root
+
+    def find(self, u):
+        """returns the root of the set of u"""
+        # TIME COMPLEXITY : O(alpha(n)) amortized
+
+        parent = self._parent
+        root = u
+        while parent[root] != root:                     # find the root
+            root = parent[root]
+        while parent[u] != root:                        # point the whole path to the root
+            parent[u], u = root, parent[u]
+        return root
+
+    def union(self, u, v):
+        """merge the sets of u and v and return True if they were different sets"""
+        # TIME COMPLEXITY : O(alpha(n)) amortized
+
+        u, v = self.find(u), self.find(v)
+        if u == v:
+            return False
+        if self._size[u] < self._size[v]:               # attach the smaller set below the larger one
+            u, v = v, u
+        self._parent[v] = u
+        self._size[u] += self._size[v]
+        return True
+
+
+class MaxSpanningForest:
+    """Maximum spanning forest of a network answering max capacity queries"""
+    # the path between two nodes in a maximum spanning tree is a maximum capacity path,
+    # so after one build every (s, t) query only climbs the tree
+
+    def __init__(self, n, links):
+        # n is number of nodes and links is the list of tuples (start, end, capacity)
+        # TIME COMPLEXITY : O(mlogm + nlogn)
+
+        # Kruskal's algorithm with the links in decreasing order of capacity
+        sets = UnionFind(n)
+        tree = [[] for _ in range(n)]                   # adjacency lists of the forest
+        for start, end, capacity in sorted(links, key=lambda link: link[2], reverse=True):
+            if sets.union(start, end):
+                tree[start].append((end, capacity))
+                tree[end].append((start, capacity))
+
+        # root every tree and find the parent, capacity to the parent and depth of every node
+        parent = list(range(n))                         # roots are their own parent
+        parent_cap = [INF] * n                          # capacity of the edge to the parent
+        self.depth = [0] * n
+        self.root = [-1] * n                            # root of the tree of every node
+        for r in range(n):
+            if self.root[r] != -1:
+                continue
+            self.root[r] = r
+            stack = [r]
+            while stack:
+                u = stack.pop()
+                for v, capacity in tree[u]:
+                    if self.root[v] == -1:
+                        self.root[v] = r
+                        parent[v] = u
+                        parent_cap[v] = capacity
+                        self.depth[v] = self.depth[u] + 1
+                        stack.append(v)
+
+        # binary lifting: up[k][u] is the 2^k-th ancestor of u and low[k][u] the minimum
+        # capacity on the way to it
+        self.up = [parent]
+        self.low = [parent_cap]
+        for _ in range(max(self.depth, default=0).bit_length() - 1):
+            prev_up, prev_low = self.up[-1], self.low[-1]
+            self.low.append([a if a < b else b for a, b in zip(prev_low, map(prev_low.__getitem__, prev_up))])
+            self.up.append([prev_up[u] for u in prev_up])
+
+    def capacity(self, s, t):
+        """returns the maximum capacity of a path from s to t"""
+        # TIME COMPLEXITY : O(logn)
+
+        if self.root[s] != self.root[t]:                # if s and t are not connected
+            raise ValueError("No path from s to t")
+        cap = INF
+        if self.depth[s] < self.depth[t]:
+            s, t = t, s
+
+        # lift s to the depth of t
+        diff = self.depth[s] - self.depth[t]
+        k = 0
+        while diff:
+            if diff & 1:
+                cap = min(cap, self.low[k][s])
+                s = self.up[k][s]
+            diff >>= 1
+            k += 1
+        if s == t:
+            return cap
+
+        # lift both to just below their lowest common ancestor
+        for k in range(len(self.up)-1, -1, -1):
+            if self.up[k][s] != self.up[k][t]:
+                cap = min(cap, self.low[k][s], self.low[k][t])
+                s = self.up[k][s]
+                t = self.up[k][t]
+        return min(cap, self.low[0][s], self.low[0][t])
+
+    def path(self, s, t):
+        """returns the list of nodes of the maximum capacity path from s to t in the forest"""
+        # TIME COMPLEXITY : O(length of the path)
+
+        if self.root[s] != self.root[t]:                # if s and t are not connected
+            raise ValueError("No path from s to t")
+        parent = self.up[0]
+        head, tail = [], []                             # s up to the common ancestor, t up to it
+        while s != t:
+            if self.depth[s] >= self.depth[t]:
+                head.append(s)
+                s = parent[s]
+            else:
+                tail.append(t)
+                t = parent[t]
+        return head + [s] + tail[::-1]
+
+    def query(self, s, t):
+        """returns the maximum capacity and a path from s to t, as findMaxCapacity"""
+        # TIME COMPLEXITY : O(logn + length of the path)
+        return self.capacity(s, t), self.path(s, t)
+
+
+def findMaxCapacity(n, links, s, t, mode='dijkstra'):
     # -----------------------------------------------------------------------
     # | INPUT                                                               |
     # | n   : int   : number of nodes                                       |
     # | links: list : list of tuples (start, end, capacity)                 |
     # | s   : int   : start node                                            |
     # | t   : int   : end node                                              |
+    # | mode: str   : 'dijkstra' or 'tree', which builds a maximum spanning |
+    # |               forest (see MaxSpanningForest, which should be kept   |
+    # |               and queried directly for many (s, t) pairs)           |
     # |                                                                     |
     # | OUTPUT                                                              |
     # | max_cap: int : maximum capacity of the path from s to t             |
     # | path   : list: list of nodes in the path from s to t                |
     # |                                                                     |
     # | Time Complexity : O(mlogm) where m is the number of links           |
+    # | The graph is built in bulk in the CSR layout (Graph.fromLinks)      |
     # -----------------------------------------------------------------------
 
-    network = Graph(n)                                  # initialize graph with n nodes
+    if mode == 'tree':
+        return MaxSpanningForest(n, links).query(s, t)
+    if mode != 'dijkstra':
+        raise ValueError("Unknown mode")
 
-    for link in links:                                  # add all links in graph
-        # add edge in both directions since it is an undirected graph
-        network.addEdge(link[0], link[1], link[2])          
-        network.addEdge(link[1], link[0], link[2])
+    # initialize graph with n nodes and all links in both directions since it is an undirected graph
+    network = Graph.fromLinks(n, links)
 
     return network.dijkstra(s, t)                       # return maximum capacity and path from s to t
+
+
+def findMaxCapacityMany(n, links, pairs, processes=1):
+    # -----------------------------------------------------------------------
+    # | INPUT                                                               |
+    # | n   : int   : number of nodes                                       |
+    # | links: list : list of tuples (start, end, capacity)                 |
+    # | pairs: list : list of tuples (s, t)                                 |
+    # | processes: int : number of worker processes, which share the graph  |
+    # |                  through shared memory                              |
+    # |                                                                     |
+    # | OUTPUT                                                              |
+    # | list : findMaxCapacity(n, links, s, t) of every pair, in order,     |
+    # |        (None, None) for a pair where t is not reachable from s      |
+    # |        (findMaxCapacity raises instead), so one such pair does not  |
+    # |        lose the answers of the others                               |
+    # |                                                                     |
+    # | The graph is built once and the pairs are grouped by source, so     |
+    # | one widest path search from every distinct source answers all its   |
+    # | targets, stopping once they are all explored                        |
+    # |                                                                     |
+    # | Time Complexity : O(m + S*mlogn) for S distinct sources             |
+    # -----------------------------------------------------------------------
+
+    network = Graph.fromLinks(n, links)
+
+    targets = {}                                        # source -> list of its distinct targets
+    for s, t in pairs:
+        targets.setdefault(s, {})[t] = None
+    tasks = [(s, list(ts)) for s, ts in targets.items()]
+
+    if processes <= 1 or len(tasks) <= 1:
+        answers = [_answer_source(network, s, ts) for s, ts in tasks]
+    else:
+        blocks = []                                     # shared memory blocks of the CSR arrays
+        try:
+            specs = []
+            for arr in network.csr():
+                if type(arr) != array:                  # capacities of mixed types are copied
+                    specs.append(('list', arr))
+                    continue
+                shm = shared_memory.SharedMemory(create=True, size=max(1, len(arr) * arr.itemsize))
+                blocks.append(shm)
+                shm.buf[:len(arr) * arr.itemsize] = arr.tobytes()
+                specs.append(('shm', shm.name, arr.typecode, len(arr)))
+            with multiprocessing.Pool(processes, _attach_graph, (n, specs)) as pool:
+                answers = pool.starmap(_answer_source_worker, tasks, chunksize=max(1, len(tasks) // (4 * processes)))
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    found = {}                                          # (s, t) -> (capacity, path)
+    for (s, ts), answer in zip(tasks, answers):
+        for t, result in zip(ts, answer):
+            found[(s, t)] = result
+    return [found[pair] for pair in pairs]
+
+
+def _answer_source(network, s, targets):
+    # (capacity, path) from s to every target, as Graph.dijkstra, (None, None) if unreachable
+    capacity, prev_path = network._widest_paths(s, targets)
+    answer = []
+    for t in targets:
+        if capacity[t] is None:                         # t is not reachable from s
+            answer.append((None, None))
+        else:
+            answer.append((capacity[t], _trace_path(prev_path, t)))
+    return answer
+
+
+_shared_graph = None                                    # graph of a worker of findMaxCapacityMany
+_shared_blocks = []                                     # shared memory blocks it is a view of
+
+
+def _attach_graph(n, specs):
+    # initializer of the workers of findMaxCapacityMany, views the CSR arrays in shared memory
+    global _shared_graph
+    arrays = []
+    for spec in specs:
+        if spec[0] == 'list':
+            arrays.append(spec[1])
+            continue
+        _, name, typecode, length = spec
+        shm = shared_memory.SharedMemory(name=name)
+        _shared_blocks.append(shm)
+        arrays.append(shm.buf[:length * array(typecode).itemsize].cast(typecode))
+    _shared_graph = Graph(n)
+    _shared_graph.edges = None
+    _shared_graph._csr = tuple(arrays)
+
+
+def _answer_source_worker(s, targets):
+    return _answer_source(_shared_graph, s, targets)